@@ -0,0 +1,105 @@
+# batch.py
+
+import os
+import re
+import json
+import time
+import shutil
+import asyncio
+import traceback
+from agentx.store import SessionStore
+from agentx.session import Session
+from agentx.trace import trace_path, read_trace, USAGE_FIELDS
+from agentx.config import MAX_CONTINUATION_ITERATIONS, BATCH_CONCURRENCY
+
+def load_tasks(path):
+    """Reads a tasks file: one JSON object per line with a "prompt", and optionally "cwd"
+    (relative to the tasks file), "max_iterations" and "id". Blank lines and lines starting
+    with # are skipped."""
+    base = os.path.dirname(os.path.abspath(path))
+    tasks = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            where = f"{path}:{number}"
+            try:
+                task = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{where}: not valid JSON ({e})")
+            if not isinstance(task, dict) or not isinstance(task.get("prompt"), str) or not task["prompt"].strip():
+                raise ValueError(f"{where}: a task needs a non-empty \"prompt\"")
+            max_iterations = task.get("max_iterations")
+            if max_iterations is not None and (not isinstance(max_iterations, int) or max_iterations < 1):
+                raise ValueError(f"{where}: \"max_iterations\" must be a positive integer")
+            # The id names the task's output files, so it is kept to safe characters
+            task_id = re.sub(r"[^A-Za-z0-9._-]+", "-", str(task.get("id") or f"task-{number:04d}")).strip("-.")
+            if not task_id or task_id in seen:
+                raise ValueError(f"{where}: duplicate or empty task id {task.get('id')!r}")
+            seen.add(task_id)
+            tasks.append({
+                "id": task_id,
+                "prompt": task["prompt"],
+                "cwd": os.path.join(base, task.get("cwd") or "."),
+                "max_iterations": max_iterations,
+            })
+    return tasks
+
+def task_usage(session_id):
+    # Token totals of every turn the task's session ran
+    path = trace_path(session_id)
+    if not os.path.exists(path):
+        return {}
+    _, turns = read_trace(path)
+    return {field: sum(turn.get(field, 0) for turn in turns) for field in USAGE_FIELDS}
+
+async def run_task(task, out_dir, semaphore, max_iterations=MAX_CONTINUATION_ITERATIONS):
+    """Runs one task as an automode session of its own, in its cwd, with everything it
+    prints going to <id>.log in out_dir. Returns the task's result record."""
+    async with semaphore:
+        log_path = os.path.join(out_dir, f"{task['id']}.log")
+        store = SessionStore()
+        result = {"id": task["id"], "session": store.session_id, "cwd": task["cwd"]}
+        start = time.perf_counter()
+        with open(log_path, "w", encoding="utf-8") as log:
+            try:
+                os.makedirs(task["cwd"], exist_ok=True)
+                session = Session(store, workspace=task["cwd"], out=log)
+                print(f"Task {task['id']} in {task['cwd']}\n{task['prompt']}\n", file=log)
+                status, iterations = await session.arun_automode(task["prompt"], task["max_iterations"] or max_iterations)
+                result.update(status=status, iterations=iterations)
+            except Exception as e:
+                traceback.print_exc(file=log)
+                result.update(status="failed", iterations=0, error=str(e))
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        result["log"] = log_path
+        if os.path.exists(trace_path(store.session_id)):
+            result["trace"] = os.path.join(out_dir, f"{task['id']}.trace.jsonl")
+            shutil.copyfile(trace_path(store.session_id), result["trace"])
+        result.update(task_usage(store.session_id))
+        with open(os.path.join(out_dir, f"{task['id']}.json"), "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        return result
+
+async def arun_batch(tasks, out_dir, concurrency=BATCH_CONCURRENCY, max_iterations=MAX_CONTINUATION_ITERATIONS, on_done=None):
+    """Runs tasks with at most `concurrency` at a time, appending each result to
+    results.jsonl in out_dir as it finishes. Returns the results in task order."""
+    os.makedirs(out_dir, exist_ok=True)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results_path = os.path.join(out_dir, "results.jsonl")
+
+    async def run(task):
+        result = await run_task(task, out_dir, semaphore, max_iterations)
+        with open(results_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result) + "\n")
+        if on_done is not None:
+            on_done(result)
+        return result
+
+    return await asyncio.gather(*(run(task) for task in tasks))
+
+def run_batch(tasks, out_dir, concurrency=BATCH_CONCURRENCY, max_iterations=MAX_CONTINUATION_ITERATIONS, on_done=None):
+    from agentx.engine import run_turn
+    return run_turn(arun_batch(tasks, out_dir, concurrency, max_iterations, on_done))
@@ -0,0 +1,300 @@
+# cassette.py
+
+import json
+import gzip
+import atexit
+import time
+import asyncio
+import threading
+from collections import deque
+from anthropic import _base_client
+from agentx.config import CASSETTE_PATH, CASSETTE_MODE, REPLAY_SPEED
+
+CASSETTE_VERSION = 1
+
+# Transports have to come from the httpx package the SDK runs on; newer releases of the
+# anthropic SDK are built on httpx2 and reject plain httpx objects
+httpx = getattr(_base_client, "httpx2", None) or _base_client.httpx
+
+def encode_chunk(data):
+    # Raw response bytes as JSON text; bytes that are not valid UTF-8 survive as surrogates
+    return data.decode("utf-8", "surrogateescape")
+
+def decode_chunk(text):
+    return text.encode("utf-8", "surrogateescape")
+
+def tool_key(tool_name, tool_input):
+    return json.dumps([tool_name, tool_input], sort_keys=True)
+
+class Cassette:
+    """A recording of a session's model traffic, tool calls and user turns, one JSON record per line.
+
+    In "record" mode every HTTP exchange is written with the time offset of each response
+    chunk, so a replay reproduces the stream's timing; tool calls are written with their
+    result and duration. In "replay" mode HTTP responses are served from the file in order
+    and tool results by (name, input), with every delay divided by speed (0 means no delay).
+    Paths ending in .gz are gzip-compressed.
+    """
+
+    def __init__(self, path, mode="record", speed=1.0, live_tools=False):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.live_tools = live_tools
+        self.lock = threading.Lock()
+        self.exchanges = deque()
+        self.tools = {}
+        self.calls = {}
+        self.turns = []
+        self.mismatches = 0
+        self.file = None
+        if mode == "replay":
+            self.load()
+        else:
+            opener = gzip.open if path.endswith(".gz") else open
+            self.file = opener(path, "wt", encoding="utf-8")
+            # Closed at exit, so a .gz recording gets its trailer; one that still misses it
+            # (killed process) is read up to where it stops
+            atexit.register(self.close)
+            self.write({"type": "cassette", "version": CASSETTE_VERSION, "time": time.time()})
+
+    def load(self):
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    self.add_record(line)
+            except EOFError:
+                # A compressed recording cut short by a crash has no end-of-stream marker
+                pass
+
+    def add_record(self, line):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # A recording cut short by a crash ends in a partial line
+            return
+        if record["type"] == "http":
+            self.exchanges.append(record)
+        elif record["type"] == "tool":
+            self.tools.setdefault(tool_key(record["name"], record["input"]), deque()).append(record)
+        elif record["type"] == "call":
+            self.calls.setdefault(record["name"], deque()).append(record)
+        elif record["type"] == "turn":
+            self.turns.append(record)
+
+    def write(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def delay(self, seconds):
+        return seconds / self.speed if self.speed > 0 else 0
+
+    def record_turn(self, **turn):
+        if self.mode == "record":
+            self.write(dict(turn, type="turn", time=time.time()))
+
+    def record_exchange(self, request, body, response, headers_at, chunks):
+        self.write({
+            "type": "http",
+            "method": request.method,
+            "path": request.url.path,
+            "request_bytes": len(body),
+            "status": response.status_code,
+            "headers": [(name.decode("latin-1"), value.decode("latin-1")) for name, value in response.headers.raw],
+            "headers_at": headers_at,
+            "chunks": chunks,
+        })
+
+    def next_exchange(self, request, body):
+        with self.lock:
+            if not self.exchanges:
+                raise RuntimeError(f"Cassette {self.path} has no more recorded responses")
+            exchange = self.exchanges.popleft()
+            # Requests are allowed to differ (that is the point of comparing before/after
+            # a change); they are only counted
+            if exchange["path"] != request.url.path or exchange["request_bytes"] != len(body):
+                self.mismatches += 1
+            return exchange
+
+    def run_tool(self, execute, tool_name, tool_input):
+        if self.mode == "record":
+            start = time.perf_counter()
+            result = execute(tool_name, tool_input)
+            self.write({"type": "tool", "name": tool_name, "input": tool_input, "result": str(result), "duration": time.perf_counter() - start})
+            return result
+        if not self.live_tools:
+            with self.lock:
+                recorded = self.tools.get(tool_key(tool_name, tool_input))
+                record = recorded.popleft() if recorded else None
+            if record is not None:
+                time.sleep(self.delay(record["duration"]))
+                return record["result"]
+            self.mismatches += 1
+        return execute(tool_name, tool_input)
+
+    def async_http_client(self):
+        from anthropic import DefaultAsyncHttpxClient
+        inner = httpx.AsyncHTTPTransport() if self.mode == "record" else None
+        return DefaultAsyncHttpxClient(transport=AsyncCassetteTransport(self, inner))
+
+    def http_client(self):
+        from anthropic import DefaultHttpxClient
+        inner = httpx.HTTPTransport() if self.mode == "record" else None
+        return DefaultHttpxClient(transport=CassetteTransport(self, inner))
+
+    def wrap_call(self, name, func, encode=lambda value: value, decode=lambda value: value):
+        """Record or replay whole calls of func, for clients that do not go through httpx (litellm)."""
+        def call(*args, **kwargs):
+            if self.mode == "record":
+                start = time.perf_counter()
+                result = func(*args, **kwargs)
+                self.write({"type": "call", "name": name, "result": encode(result), "duration": time.perf_counter() - start})
+                return result
+            with self.lock:
+                recorded = self.calls.get(name)
+                if not recorded:
+                    raise RuntimeError(f"Cassette {self.path} has no more recorded calls to {name}")
+                record = recorded.popleft()
+            time.sleep(self.delay(record["duration"]))
+            return decode(record["result"])
+
+        return call
+
+class AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, cassette, request, body, response, start):
+        self.cassette = cassette
+        self.request = request
+        self.body = body
+        self.response = response
+        self.start = start
+        self.headers_at = round(time.perf_counter() - start, 4)
+        self.chunks = []
+
+    async def __aiter__(self):
+        async for chunk in self.response.stream:
+            self.chunks.append([round(time.perf_counter() - self.start, 4), encode_chunk(chunk)])
+            yield chunk
+
+    async def aclose(self):
+        await self.response.aclose()
+        self.cassette.record_exchange(self.request, self.body, self.response, self.headers_at, self.chunks)
+
+class RecordingStream(httpx.SyncByteStream):
+    def __init__(self, cassette, request, body, response, start):
+        self.cassette = cassette
+        self.request = request
+        self.body = body
+        self.response = response
+        self.start = start
+        self.headers_at = round(time.perf_counter() - start, 4)
+        self.chunks = []
+
+    def __iter__(self):
+        for chunk in self.response.stream:
+            self.chunks.append([round(time.perf_counter() - self.start, 4), encode_chunk(chunk)])
+            yield chunk
+
+    def close(self):
+        self.response.close()
+        self.cassette.record_exchange(self.request, self.body, self.response, self.headers_at, self.chunks)
+
+class AsyncReplayStream(httpx.AsyncByteStream):
+    # Chunk offsets count from the start of the request, like when they were recorded
+    def __init__(self, cassette, chunks, start):
+        self.cassette = cassette
+        self.chunks = chunks
+        self.start = start
+
+    async def __aiter__(self):
+        for offset, chunk in self.chunks:
+            wait = self.cassette.delay(offset) - (time.perf_counter() - self.start)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield decode_chunk(chunk)
+
+class ReplayStream(httpx.SyncByteStream):
+    def __init__(self, cassette, chunks, start):
+        self.cassette = cassette
+        self.chunks = chunks
+        self.start = start
+
+    def __iter__(self):
+        for offset, chunk in self.chunks:
+            wait = self.cassette.delay(offset) - (time.perf_counter() - self.start)
+            if wait > 0:
+                time.sleep(wait)
+            yield decode_chunk(chunk)
+
+def replay_headers(exchange):
+    return [(name.encode("latin-1"), value.encode("latin-1")) for name, value in exchange["headers"]]
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cassette, inner=None):
+        self.cassette = cassette
+        self.inner = inner
+
+    async def handle_async_request(self, request):
+        start = time.perf_counter()
+        body = await request.aread()
+        if self.cassette.mode == "replay":
+            exchange = self.cassette.next_exchange(request, body)
+            await asyncio.sleep(self.cassette.delay(exchange["headers_at"]))
+            return httpx.Response(exchange["status"], headers=replay_headers(exchange), stream=AsyncReplayStream(self.cassette, exchange["chunks"], start), request=request)
+        response = await self.inner.handle_async_request(request)
+        return httpx.Response(response.status_code, headers=response.headers, stream=AsyncRecordingStream(self.cassette, request, body, response, start), request=request, extensions=response.extensions)
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
+
+class CassetteTransport(httpx.BaseTransport):
+    def __init__(self, cassette, inner=None):
+        self.cassette = cassette
+        self.inner = inner
+
+    def handle_request(self, request):
+        start = time.perf_counter()
+        body = request.read()
+        if self.cassette.mode == "replay":
+            exchange = self.cassette.next_exchange(request, body)
+            time.sleep(self.cassette.delay(exchange["headers_at"]))
+            return httpx.Response(exchange["status"], headers=replay_headers(exchange), stream=ReplayStream(self.cassette, exchange["chunks"], start), request=request)
+        response = self.inner.handle_request(request)
+        return httpx.Response(response.status_code, headers=response.headers, stream=RecordingStream(self.cassette, request, body, response, start), request=request, extensions=response.extensions)
+
+    def close(self):
+        if self.inner is not None:
+            self.inner.close()
+
+# The cassette in use for this process: set by the CLI flags, or by AGENTX_CASSETTE
+_active = None
+_configured = False
+
+def use_cassette(cassette):
+    global _active, _configured
+    _active = cassette
+    _configured = True
+    return cassette
+
+def get_cassette():
+    global _configured
+    if not _configured:
+        _configured = True
+        if CASSETTE_PATH:
+            use_cassette(Cassette(CASSETTE_PATH, CASSETTE_MODE, REPLAY_SPEED))
+    return _active
+
+def run_tool(execute, tool_name, tool_input):
+    cassette = get_cassette()
+    if cassette is None:
+        return execute(tool_name, tool_input)
+    return cassette.run_tool(execute, tool_name, tool_input)
@@ -1,9 +1,15 @@
 # cli.py
 
 import os
+import time
+import argparse
 from colorama import init, Fore, Style
-from agentx.conversation import chat_with_claude, process_and_display_response
-from agentx.config import USER_COLOR, CLAUDE_COLOR, TOOL_COLOR, CONTINUATION_EXIT_PHRASE, MAX_CONTINUATION_ITERATIONS
+from agentx.conversation import chat_with_claude, process_and_display_response, preload_engine
+from agentx.store import SessionStore, list_sessions
+from agentx.session import Session
+from agentx.images import prefetch_image
+from agentx.journal import Journal, latest_journal
+from agentx.config import USER_COLOR, CLAUDE_COLOR, TOOL_COLOR, MAX_CONTINUATION_ITERATIONS, BATCH_CONCURRENCY, SERVE_HOST, SERVE_PORT, SERVE_TOKEN
 
 # Initialize colorama
 init()
@@ -11,15 +17,194 @@ init()
 def print_colored(text, color):
     print(f"{color}{text}{Style.RESET_ALL}")
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="agentx")
+    parser.add_argument("--resume", metavar="SESSION_ID", help="continue a saved session")
+    parser.add_argument("--sessions", action="store_true", help="list saved sessions, newest first")
+    parser.add_argument("--record", metavar="CASSETTE", help="record the session's model traffic, tool calls and prompts to a cassette file (.gz to compress)")
+    commands = parser.add_subparsers(dest="command")
+
+    undo = commands.add_parser("undo", help="revert file changes made by the agent (default: the last turn of the latest session)")
+    undo.add_argument("--session", metavar="SESSION_ID", help="session to undo changes from")
+    undo.add_argument("--steps", type=int, help="undo the last N file changes instead of the last turn")
+    undo.add_argument("--all", action="store_true", help="undo every change made in the session")
+
+    replay = commands.add_parser("replay", help="re-run a recorded session offline from its cassette")
+    replay.add_argument("cassette", help="cassette file written with --record")
+    replay.add_argument("--speed", type=float, default=1.0, help="play back N times faster; 0 removes all recorded delays")
+    replay.add_argument("--live-tools", action="store_true", help="run the tools for real instead of using the recorded results")
+
+    stats = commands.add_parser("stats", help="show where the time of traced turns went (default: the latest session)")
+    stats.add_argument("--session", metavar="SESSION_ID", help="session to summarize")
+    stats.add_argument("--all", action="store_true", help="summarize every traced session")
+    stats.add_argument("--top", type=int, default=5, help="number of tools and turns to list")
+
+    batch = commands.add_parser("batch", help="run the prompts of a tasks file as automode sessions, several at a time")
+    batch.add_argument("tasks", help="JSONL file with one task per line: {\"prompt\": ..., \"cwd\": ..., \"max_iterations\": ..., \"id\": ...}")
+    batch.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help=f"tasks to run at the same time (default {BATCH_CONCURRENCY})")
+    batch.add_argument("--out", metavar="DIR", help="folder for the per-task logs and results (default: agentx-batch-<time>)")
+    batch.add_argument("--max-iterations", type=int, default=MAX_CONTINUATION_ITERATIONS, help="iteration cap for tasks that do not set their own")
+
+    serve = commands.add_parser("serve", help="serve sessions over a local HTTP API with streamed events")
+    serve.add_argument("--host", default=SERVE_HOST, help=f"address to listen on (default {SERVE_HOST})")
+    serve.add_argument("--port", type=int, default=SERVE_PORT, help=f"port to listen on (default {SERVE_PORT})")
+
+    return parser.parse_args(argv)
+
+def undo_command(args):
+    journal = Journal(args.session) if args.session else latest_journal()
+    if journal is None or not journal.entries():
+        print_colored("Nothing to undo.", TOOL_COLOR)
+        return
+    for message in journal.undo(steps=args.steps, whole_session=args.all):
+        print_colored(message, TOOL_COLOR)
+
+def replay_command(args):
+    from agentx.cassette import Cassette, use_cassette
+    cassette = use_cassette(Cassette(args.cassette, "replay", args.speed, args.live_tools))
+    if not cassette.turns:
+        print_colored(f"No recorded turns in {args.cassette}.", TOOL_COLOR)
+        return
     conversation_history = []
-    automode = False
-    
+    timings = []
+    for number, turn in enumerate(cassette.turns, 1):
+        print_colored(f"\nReplaying turn {number}/{len(cassette.turns)}: {turn['user_input']}", TOOL_COLOR)
+        start = time.perf_counter()
+        response, _ = chat_with_claude(turn["user_input"], turn.get("image_path"), conversation_history, turn["automode"], turn.get("current_iteration"), turn.get("max_iterations"))
+        timings.append(time.perf_counter() - start)
+        process_and_display_response(response)
+    print_colored(f"\nReplayed {len(timings)} turns in {sum(timings):.2f}s (speed {args.speed:g}); slowest turn {max(timings):.2f}s", TOOL_COLOR)
+    if cassette.mismatches:
+        print_colored(f"{cassette.mismatches} requests or tool calls differed from the recording", TOOL_COLOR)
+
+def stats_command(args):
+    from agentx.trace import trace_files, trace_path, read_trace, summarize
+    if args.session:
+        paths = [trace_path(args.session)]
+        if not os.path.exists(paths[0]):
+            print_colored(f"No trace for session {args.session}.", TOOL_COLOR)
+            return
+    else:
+        paths = trace_files()
+        if not paths:
+            print_colored("No traces yet.", TOOL_COLOR)
+            return
+        if not args.all:
+            paths = paths[:1]
+    spans, turns = [], []
+    for path in paths:
+        path_spans, path_turns = read_trace(path)
+        spans.extend(path_spans)
+        turns.extend(path_turns)
+    if len(paths) == 1:
+        print_colored(f"Session {os.path.basename(paths[0])[:-len('.jsonl')]}", CLAUDE_COLOR)
+    else:
+        print_colored(f"{len(paths)} sessions", CLAUDE_COLOR)
+    print(summarize(spans, turns, args.top))
+
+def batch_command(args):
+    from agentx.batch import load_tasks, run_batch
+    try:
+        tasks = load_tasks(args.tasks)
+    except (OSError, ValueError) as e:
+        print_colored(f"Error reading tasks: {str(e)}", TOOL_COLOR)
+        return
+    if not tasks:
+        print_colored(f"No tasks in {args.tasks}.", TOOL_COLOR)
+        return
+    out_dir = args.out or time.strftime("agentx-batch-%Y%m%d-%H%M%S")
+    print_colored(f"Running {len(tasks)} tasks, {args.concurrency} at a time; output in {out_dir}", CLAUDE_COLOR)
+    done = []
+
+    def on_done(result):
+        done.append(result)
+        print_colored(f"[{len(done)}/{len(tasks)}] {result['id']} {result['status']} after {result['iterations']} iterations in {result['seconds']:.1f}s", TOOL_COLOR)
+
+    try:
+        results = run_batch(tasks, out_dir, args.concurrency, args.max_iterations, on_done)
+    except KeyboardInterrupt:
+        print_colored(f"\nBatch interrupted; {len(done)} of {len(tasks)} tasks finished.", TOOL_COLOR)
+        return
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    print_colored(", ".join(f"{count} {status}" for status, count in sorted(counts.items())) + f"; results in {os.path.join(out_dir, 'results.jsonl')}", CLAUDE_COLOR)
+
+def serve_command(args):
+    from agentx.server import serve
+    from agentx.engine import get_client, run_turn
+    # Created up front, so the first request does not pay for importing the SDK
+    get_client()
+
+    def on_ready(address):
+        print_colored(f"Serving on http://{address[0]}:{address[1]} (Ctrl+C to stop)", CLAUDE_COLOR)
+        if SERVE_TOKEN:
+            print_colored("Requests need the bearer token from AGENTX_SERVE_TOKEN.", TOOL_COLOR)
+
+    try:
+        run_turn(serve(args.host, args.port, SERVE_TOKEN, on_ready))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print_colored(f"Error starting server: {str(e)}", TOOL_COLOR)
+        return
+    print_colored("\nServer stopped.", TOOL_COLOR)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == "undo":
+        undo_command(args)
+        return
+
+    if args.command == "stats":
+        stats_command(args)
+        return
+
+    if args.command == "batch":
+        batch_command(args)
+        return
+
+    if args.command == "serve":
+        serve_command(args)
+        return
+
+    if args.command == "replay":
+        replay_command(args)
+        return
+
+    if args.record:
+        # Before the engine preloads its client, so the client sends through the cassette
+        from agentx.cassette import Cassette, use_cassette
+        use_cassette(Cassette(args.record, "record"))
+
+    if args.sessions:
+        for session_id in list_sessions():
+            print(session_id)
+        return
+
+    if args.resume:
+        store = SessionStore(args.resume)
+        if not store.exists():
+            print_colored(f"No saved session with id {args.resume}.", TOOL_COLOR)
+            return
+        # Batch and server sessions run elsewhere; their tools keep working in the folder they used
+        cwd = store.read_meta().get("cwd")
+        session = Session(store, workspace=cwd if cwd and os.path.isdir(cwd) and cwd != os.getcwd() else None)
+        print_colored(f"Resumed session {store.session_id} with {len(session.conversation_history)} messages.", TOOL_COLOR)
+        if session.workspace:
+            print_colored(f"Working in {session.workspace}, the session's folder.", TOOL_COLOR)
+    else:
+        session = Session(SessionStore())
+
+    preload_engine()
+
     print_colored("Welcome to the Claude-3.5-Sonnet Engineer Chat with Image Support!", CLAUDE_COLOR)
     print_colored("Type 'exit' to end the conversation.", CLAUDE_COLOR)
     print_colored("Type 'image' to include an image in your message.", CLAUDE_COLOR)
     print_colored("Type 'automode [number]' to enter Autonomous mode with a specific number of iterations.", CLAUDE_COLOR)
     print_colored("While in automode, press Ctrl+C at any time to exit the automode to return to regular chat.", CLAUDE_COLOR)
+    print_colored(f"Session id: {session.session_id} (continue later with 'agentx --resume {session.session_id}')", CLAUDE_COLOR)
 
     while True:
         user_input = input(f"\n{USER_COLOR}You: {Style.RESET_ALL}")
@@ -32,9 +217,12 @@ def main():
             image_path = input(f"{USER_COLOR}Drag and drop your image here: {Style.RESET_ALL}").strip().replace("'", "")
 
             if os.path.isfile(image_path):
+                prefetch_image(image_path)
                 user_input = input(f"{USER_COLOR}You (prompt for image): {Style.RESET_ALL}")
-                response, _ = chat_with_claude(user_input, image_path, conversation_history, automode)
-                process_and_display_response(response)
+                try:
+                    session.chat(user_input, image_path)
+                except KeyboardInterrupt:
+                    print_colored("\nResponse interrupted by user.", TOOL_COLOR)
             else:
                 print_colored("Invalid image path. Please try again.", CLAUDE_COLOR)
                 continue
@@ -45,34 +233,19 @@ def main():
             else:
                 max_iterations = MAX_CONTINUATION_ITERATIONS
 
-            automode = True
             print_colored(f"Entering automode with {max_iterations} iterations. Press Ctrl+C to exit automode at any time.", TOOL_COLOR)
             user_input = input(f"\n{USER_COLOR}You: {Style.RESET_ALL}")
 
-            iteration_count = 0
             try:
-                while automode and iteration_count < max_iterations:
-                    response, exit_continuation = chat_with_claude(user_input, None, conversation_history, automode, iteration_count + 1, max_iterations)
-                    process_and_display_response(response)
-
-                    if exit_continuation or CONTINUATION_EXIT_PHRASE in response:
-                        print_colored("Automode completed.", TOOL_COLOR)
-                        automode = False
-                    else:
-                        print_colored(f"Continuation iteration {iteration_count + 1} completed.", TOOL_COLOR)
-                        user_input = "Continue with the next step."
-
-                    iteration_count += 1
-
-                    if iteration_count >= max_iterations:
-                        print_colored("Max iterations reached. Exiting automode.", TOOL_COLOR)
-                        automode = False
+                session.run_automode(user_input, max_iterations)
             except KeyboardInterrupt:
                 print_colored("\nAutomode interrupted by user. Exiting automode.", TOOL_COLOR)
-                automode = False
         else:
-            response, _ = chat_with_claude(user_input, None, conversation_history, automode)
-            process_and_display_response(response)
+            try:
+                session.chat(user_input)
+            except KeyboardInterrupt:
+                # Only the running turn is cancelled, the session carries on
+                print_colored("\nResponse interrupted by user.", TOOL_COLOR)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,253 @@
+# codeindex.py
+
+import os
+import re
+import pickle
+import hashlib
+import threading
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+from agentx.config import AGENTX_HOME, INDEX_MAX_FILE_BYTES, SEARCH_MAX_RESULTS, SEARCH_MAX_CONTEXT, SEARCH_LINE_CHARS
+from agentx.journal import write_atomic
+from agentx.listing import iter_files, match_glob
+from agentx.executor import workspace_root
+
+INDEX_DIR = os.path.join(AGENTX_HOME, "index")
+INDEX_VERSION = 1
+
+# Loaded indexes by workspace root, shared by every search in this process
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def trigrams(data):
+    # Trigrams of the lowercased bytes, so one index serves case-sensitive and -insensitive queries
+    return {data[i:i + 3] for i in range(len(data) - 2)}
+
+def unpack_trigrams(blob):
+    return {blob[i:i + 3] for i in range(0, len(blob), 3)}
+
+def required_literals(pattern, flags=0):
+    """Literal strings that every match of the regex must contain (possibly none)."""
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except Exception:
+        return []
+    literals = []
+    current = []
+
+    def flush():
+        if current:
+            literals.append("".join(current))
+            current.clear()
+
+    def collect(items):
+        for op, arg in items:
+            if op == sre_parse.LITERAL:
+                current.append(chr(arg))
+            elif op == sre_parse.SUBPATTERN:
+                flush()
+                collect(arg[-1])
+                flush()
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and arg[0] >= 1:
+                flush()
+                collect(arg[2])
+                flush()
+            else:
+                # Alternations, classes, optional parts and the like: no literal is certain
+                flush()
+
+    collect(parsed)
+    flush()
+    # Only ASCII literals: the index lowercases bytes, which leaves other letters as they are
+    return [literal for literal in literals if len(literal) >= 3 and literal.isascii()]
+
+class CodeIndex:
+    """Trigram index of the text files under a workspace root, kept on disk between runs.
+
+    Each file's entry holds its mtime, size and the sorted trigrams of its lowercased contents;
+    refresh() re-reads only files whose mtime or size changed. Searches read just the files
+    that contain every trigram of the query's literal parts.
+    """
+
+    def __init__(self, root, index_dir=INDEX_DIR):
+        self.root = os.path.abspath(root)
+        digest = hashlib.sha256(self.root.encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(index_dir, f"{digest}.pickle")
+        self.files = {}
+        self.postings = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                saved = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            return
+        if saved.get("version") != INDEX_VERSION or saved.get("root") != self.root:
+            return
+        self.files = saved["files"]
+        for relative, (_, _, blob) in self.files.items():
+            if blob is not None:
+                self.add_postings(relative, blob)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        write_atomic(self.path, pickle.dumps({"version": INDEX_VERSION, "root": self.root, "files": self.files}, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def add_postings(self, relative, blob):
+        for trigram in unpack_trigrams(blob):
+            self.postings.setdefault(trigram, set()).add(relative)
+
+    def remove_postings(self, relative, blob):
+        for trigram in unpack_trigrams(blob):
+            files = self.postings.get(trigram)
+            if files is not None:
+                files.discard(relative)
+                if not files:
+                    del self.postings[trigram]
+
+    def index_file(self, full_path, relative, stat):
+        old = self.files.get(relative)
+        if old is not None and old[2] is not None:
+            self.remove_postings(relative, old[2])
+        blob = None
+        if stat.st_size <= INDEX_MAX_FILE_BYTES:
+            try:
+                with open(full_path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                data = b"\0"
+            # Binary files are remembered (so they are not re-read) but never searched
+            if b"\0" not in data[:8192]:
+                blob = b"".join(sorted(trigrams(data.lower())))
+                self.add_postings(relative, blob)
+        self.files[relative] = (stat.st_mtime_ns, stat.st_size, blob)
+
+    def refresh(self):
+        """Bring the index up to date with the workspace; returns the number of files re-indexed."""
+        seen = set()
+        changed = 0
+        for full_path, relative in iter_files(self.root):
+            try:
+                stat = os.stat(full_path)
+            except OSError:
+                continue
+            seen.add(relative)
+            entry = self.files.get(relative)
+            if entry is None or entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+                self.index_file(full_path, relative, stat)
+                changed += 1
+        for relative in [relative for relative in self.files if relative not in seen]:
+            blob = self.files.pop(relative)[2]
+            if blob is not None:
+                self.remove_postings(relative, blob)
+            changed += 1
+        if changed:
+            self.save()
+        return changed
+
+    def candidates(self, literals):
+        searchable = [relative for relative, entry in self.files.items() if entry[2] is not None]
+        if not literals:
+            return sorted(searchable)
+        result = None
+        for literal in literals:
+            for trigram in trigrams(literal.lower().encode("utf-8")):
+                files = self.postings.get(trigram, set())
+                result = set(files) if result is None else result & files
+                if not result:
+                    return []
+        return sorted(result)
+
+def get_index(root):
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = CodeIndex(root)
+        return _indexes[root]
+
+def workspace_scope(path):
+    # Searches inside the workspace share its index and are narrowed by a path prefix;
+    # anything else gets an index of its own
+    target = os.path.abspath(path)
+    cwd = workspace_root()
+    if target == cwd or target.startswith(cwd.rstrip(os.sep) + os.sep):
+        prefix = os.path.relpath(target, cwd).replace(os.sep, "/")
+        return cwd, "" if prefix == "." else prefix
+    return target, ""
+
+def in_scope(relative, prefix, include):
+    if prefix and relative != prefix and not relative.startswith(prefix + "/"):
+        return False
+    if include:
+        return match_glob(relative, include)
+    return True
+
+def format_line(relative, number, line, separator):
+    if len(line) > SEARCH_LINE_CHARS:
+        line = line[:SEARCH_LINE_CHARS] + "..."
+    return f"{relative}{separator}{number}{separator} {line}"
+
+def search_code(query, path=".", regex=False, case_sensitive=None, include=None, context=0, max_results=SEARCH_MAX_RESULTS):
+    try:
+        # Smart case: a query with no capitals matches any case unless told otherwise
+        if case_sensitive is None:
+            case_sensitive = query != query.lower()
+        flags = 0 if case_sensitive else re.IGNORECASE
+        pattern = query if regex else re.escape(query)
+        try:
+            compiled = re.compile(pattern, flags)
+        except re.error as e:
+            return f"Error in search pattern: {str(e)}"
+        literals = required_literals(pattern, flags)
+        context = max(0, min(int(context or 0), SEARCH_MAX_CONTEXT))
+
+        root, prefix = workspace_scope(path)
+        index = get_index(root)
+        with index.lock:
+            index.refresh()
+            candidates = [relative for relative in index.candidates(literals) if in_scope(relative, prefix, include)]
+            indexed = len(index.files)
+
+        output = []
+        matches = 0
+        matched_files = 0
+        truncated = False
+        for relative in candidates:
+            try:
+                with open(os.path.join(root, relative), "r", encoding="utf-8", errors="replace") as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                continue
+            hits = [i for i, line in enumerate(lines) if compiled.search(line)]
+            if not hits:
+                continue
+            matched_files += 1
+            hit_set = set(hits)
+            if output:
+                output.append("--")
+            last_shown = -1
+            for i in hits:
+                if matches >= max_results:
+                    truncated = True
+                    break
+                matches += 1
+                start = max(i - context, last_shown + 1)
+                if context and last_shown >= 0 and start > last_shown + 1:
+                    output.append("--")
+                for j in range(start, min(i + context, len(lines) - 1) + 1):
+                    if j > last_shown:
+                        output.append(format_line(relative, j + 1, lines[j], ":" if j in hit_set else "-"))
+                        last_shown = j
+            if truncated:
+                break
+    except Exception as e:
+        return f"Error searching code: {str(e)}"
+
+    header = f"[search_code {query!r}: {matches} matches in {matched_files} files; {len(candidates)} of {indexed} indexed files searched"
+    if truncated:
+        header += f"; stopped at {max_results} matches, narrow it down with path, include or a more specific query"
+    return header + "]\n" + "\n".join(output)
@@ -1,6 +1,7 @@
 # config.py
 
-from colorama import Fore
+import os
+from colorama import Fore, Style
 
 USER_COLOR = Fore.WHITE
 CLAUDE_COLOR = Fore.BLUE
@@ -10,5 +11,116 @@ RESULT_COLOR = Fore.GREEN
 CONTINUATION_EXIT_PHRASE = "AUTOMODE_COMPLETE"
 MAX_CONTINUATION_ITERATIONS = 25
 
+# Upper bound on tool calls from one assistant turn that run at the same time
+MAX_TOOL_WORKERS = 8
+
+# Streaming output: "frames" batches text deltas at RENDER_FPS, "instant" writes every delta as it arrives
+RENDER_MODE = os.environ.get("AGENTX_RENDER", "frames")
+RENDER_FPS = int(os.environ.get("AGENTX_RENDER_FPS", "30"))
+
+# Tool results longer than this are cut short on screen
+TOOL_RESULT_MAX_LINES = 40
+TOOL_RESULT_MAX_CHARS = 4000
+
+# Context budget: once the estimated history size passes CONTEXT_TOKEN_BUDGET, old turns are
+# compacted down to CONTEXT_COMPACT_TARGET of it. The last CONTEXT_KEEP_RECENT_TURNS turns are never touched.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("AGENTX_CONTEXT_BUDGET", "150000"))
+CONTEXT_COMPACT_TARGET = 0.75
+CONTEXT_KEEP_RECENT_TURNS = 2
+CONTEXT_SUMMARIZE = os.environ.get("AGENTX_CONTEXT_SUMMARIZE", "0") == "1"
+STALE_TOOL_RESULT_CHARS = 1000
+CHARS_PER_TOKEN = 4
+IMAGE_TOKEN_ESTIMATE = 1600
+
+# Sessions, caches and other local state live here
+AGENTX_HOME = os.environ.get("AGENTX_HOME", os.path.join(os.path.expanduser("~"), ".agentx"))
+
+# Images are scaled to fit IMAGE_MAX_SIZE; encoded payloads are cached in memory and on disk
+IMAGE_MAX_SIZE = 1024
+IMAGE_JPEG_QUALITY = 85
+IMAGE_CACHE_ENTRIES = 32
+IMAGE_CACHE_DISK_BYTES = 256 * 1024 * 1024
+
+# Images are only re-sent for IMAGE_KEEP_TURNS turns and while they fit in IMAGE_BYTE_BUDGET
+# (base64 bytes per request); older ones go out as a short text placeholder
+IMAGE_KEEP_TURNS = int(os.environ.get("AGENTX_IMAGE_KEEP_TURNS", "3"))
+IMAGE_BYTE_BUDGET = 4 * 1024 * 1024
+
+# read_file returns at most READ_FILE_DEFAULT_LINES lines / READ_FILE_MAX_BYTES per call
+# and memory-maps files from READ_FILE_MMAP_THRESHOLD bytes up
+READ_FILE_DEFAULT_LINES = 2000
+READ_FILE_MAX_BYTES = 100 * 1024
+READ_FILE_MMAP_THRESHOLD = 1024 * 1024
+
+# Diffs of file writes: files above DIFF_MAX_BYTES are not diffed; gaps without unique lines
+# fall back to difflib only up to DIFF_FALLBACK_CELLS (old lines x new lines)
+DIFF_MAX_BYTES = 2 * 1024 * 1024
+DIFF_FALLBACK_CELLS = 1000000
+
+# list_files output cap, and folders that are never descended into (on top of .gitignore)
+LIST_FILES_MAX_ENTRIES = 500
+LIST_FILES_PATTERN_DEPTH = 20
+ALWAYS_IGNORED_DIRS = {".git", "node_modules", "__pycache__", ".venv", "venv", ".tox", ".mypy_cache", ".pytest_cache"}
+
+# search_code: files above INDEX_MAX_FILE_BYTES are not indexed; results are capped at
+# SEARCH_MAX_RESULTS matching lines with up to SEARCH_MAX_CONTEXT lines of context each
+INDEX_MAX_FILE_BYTES = 1024 * 1024
+SEARCH_MAX_RESULTS = 100
+SEARCH_MAX_CONTEXT = 5
+SEARCH_LINE_CHARS = 300
+
+# find_symbol returns at most SYMBOL_MAX_RESULTS definitions (and references), with up to
+# SYMBOL_MAX_SOURCE_LINES lines of source each
+SYMBOL_MAX_RESULTS = 50
+SYMBOL_MAX_SOURCE_LINES = 200
+
+# Web search: results are cached by normalized query in memory (SEARCH_CACHE_ENTRIES) and on
+# disk for SEARCH_CACHE_TTL seconds; SEARCH_TIMEOUT is (connect, read) in seconds
+SEARXNG_URL = os.environ.get("SEARXNG_URL", "http://localhost:8888")
+SEARXNG_MAX_RESULTS = 5
+SEARCH_CACHE_ENTRIES = 128
+SEARCH_CACHE_TTL = int(os.environ.get("AGENTX_SEARCH_TTL", str(6 * 60 * 60)))
+SEARCH_TIMEOUT = (5, 20)
+
+# multi_search: backend ("tavily" or "searxng"), queries run at once, size of the merged digest
+SEARCH_BACKEND = os.environ.get("AGENTX_SEARCH_BACKEND", "tavily")
+MULTI_SEARCH_MAX_QUERIES = 8
+MULTI_SEARCH_MAX_RESULTS = 10
+MULTI_SEARCH_SNIPPET_CHARS = 300
+
+# Record/replay of model traffic: AGENTX_CASSETTE names the file, AGENTX_CASSETTE_MODE is
+# "record" or "replay", AGENTX_REPLAY_SPEED divides recorded delays (0 = no delays)
+CASSETTE_PATH = os.environ.get("AGENTX_CASSETTE")
+CASSETTE_MODE = os.environ.get("AGENTX_CASSETTE_MODE", "record")
+REPLAY_SPEED = float(os.environ.get("AGENTX_REPLAY_SPEED", "1"))
+
+# Model requests: transient failures (429, 529 overloaded, 5xx, timeouts, dropped connections)
+# are tried up to RETRY_MAX_ATTEMPTS times, waiting as long as retry-after asks (at most
+# RETRY_MAX_WAIT seconds) or backing off exponentially from RETRY_BASE_DELAY to RETRY_MAX_DELAY.
+# A request that sends nothing for MODEL_READ_TIMEOUT seconds counts as timed out. With
+# HEDGE_AFTER > 0, a second copy of a request goes out when the first has not produced a
+# token after that many seconds, and whichever answers first is used
+RETRY_MAX_ATTEMPTS = int(os.environ.get("AGENTX_RETRY_ATTEMPTS", "6"))
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+RETRY_MAX_WAIT = 120.0
+MODEL_READ_TIMEOUT = float(os.environ.get("AGENTX_READ_TIMEOUT", "120"))
+HEDGE_AFTER = float(os.environ.get("AGENTX_HEDGE_AFTER", "0"))
+
+# Per-turn timing and token traces go to AGENTX_HOME/traces; AGENTX_TRACE=0 turns them off
+TRACE_ENABLED = os.environ.get("AGENTX_TRACE", "1") != "0"
+
+# agentx batch: tasks that run at the same time unless --concurrency says otherwise
+BATCH_CONCURRENCY = int(os.environ.get("AGENTX_BATCH_CONCURRENCY", "4"))
+
+# agentx serve: address of the local HTTP API; with AGENTX_SERVE_TOKEN set, every request needs
+# "Authorization: Bearer <token>". Request bodies are capped at SERVE_MAX_BODY bytes, and open
+# event streams get a keep-alive comment every SERVE_KEEPALIVE seconds
+SERVE_HOST = os.environ.get("AGENTX_SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.environ.get("AGENTX_SERVE_PORT", "8765"))
+SERVE_TOKEN = os.environ.get("AGENTX_SERVE_TOKEN")
+SERVE_MAX_BODY = 1024 * 1024
+SERVE_KEEPALIVE = 15
+
 def print_colored(text, color):
     print(f"{color}{text}{Style.RESET_ALL}")
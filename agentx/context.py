@@ -0,0 +1,199 @@
+# context.py
+
+import json
+from agentx.config import (
+    CONTEXT_TOKEN_BUDGET, CONTEXT_COMPACT_TARGET, CONTEXT_KEEP_RECENT_TURNS,
+    STALE_TOOL_RESULT_CHARS, CHARS_PER_TOKEN, IMAGE_TOKEN_ESTIMATE,
+    IMAGE_KEEP_TURNS, IMAGE_BYTE_BUDGET
+)
+
+# Tools whose result is the content of the file at tool_input["path"]
+FILE_CONTENT_TOOLS = {"read_file"}
+# Tools that change the file at tool_input["path"], making earlier reads of it stale
+FILE_WRITE_TOOLS = {"create_file", "write_to_file", "edit_file"}
+
+def block_field(block, name, default=None):
+    if isinstance(block, dict):
+        return block.get(name, default)
+    return getattr(block, name, default)
+
+def estimate_tokens(content):
+    # A character-count estimate is close enough for budgeting and costs nothing per request
+    if content is None:
+        return 0
+    if isinstance(content, str):
+        return len(content) // CHARS_PER_TOKEN + 1
+    total = 0
+    for block in content:
+        kind = block_field(block, "type")
+        if kind == "text":
+            total += estimate_tokens(block_field(block, "text", ""))
+        elif kind == "image":
+            total += IMAGE_TOKEN_ESTIMATE
+        elif kind == "tool_use":
+            total += estimate_tokens(json.dumps(block_field(block, "input", {}), default=str))
+        elif kind == "tool_result":
+            total += estimate_tokens(block_field(block, "content"))
+        else:
+            total += estimate_tokens(str(block))
+    return total
+
+def message_tokens(message):
+    return estimate_tokens(message.get("content")) + 4
+
+def history_tokens(conversation_history):
+    return sum(message_tokens(message) for message in conversation_history)
+
+def is_turn_start(message):
+    # A turn starts with a user message that is not just carrying tool results
+    if message["role"] != "user":
+        return False
+    content = message.get("content")
+    if isinstance(content, str):
+        return True
+    return not any(block_field(block, "type") == "tool_result" for block in content or [])
+
+def turn_starts(conversation_history):
+    return [i for i, message in enumerate(conversation_history) if is_turn_start(message)]
+
+def tool_results_with_calls(conversation_history):
+    # Yields (message index, tool_result block, tool name, tool input) in history order
+    calls = {}
+    for i, message in enumerate(conversation_history):
+        content = message.get("content")
+        if isinstance(content, str) or not content:
+            continue
+        for block in content:
+            kind = block_field(block, "type")
+            if kind == "tool_use":
+                calls[block_field(block, "id")] = (block_field(block, "name"), block_field(block, "input") or {})
+            elif kind == "tool_result" and isinstance(block, dict):
+                name, tool_input = calls.get(block.get("tool_use_id"), (None, {}))
+                yield i, block, name, tool_input
+
+def is_compacted(content):
+    # Compacted results are recognised by their markers, since tool_result blocks can't carry extra keys
+    return isinstance(content, str) and (content.startswith("[Earlier read of ") or content.endswith(" result omitted]"))
+
+def read_key(tool_input):
+    return (tool_input.get("path"), tool_input.get("offset", 1), tool_input.get("limit"))
+
+def collapse_superseded_reads(conversation_history):
+    # A read is stale once the same range of the file is read again or the file is written;
+    # returns whether any result was collapsed
+    changed = False
+    results = list(tool_results_with_calls(conversation_history))
+    latest_read = {}
+    latest_write = {}
+    for position, (i, block, name, tool_input) in enumerate(results):
+        if name in FILE_CONTENT_TOOLS:
+            latest_read[read_key(tool_input)] = position
+        elif name in FILE_WRITE_TOOLS:
+            latest_write[tool_input.get("path")] = position
+    for position, (i, block, name, tool_input) in enumerate(results):
+        if name not in FILE_CONTENT_TOOLS or is_compacted(block.get("content")):
+            continue
+        path = tool_input.get("path")
+        if latest_read[read_key(tool_input)] > position or latest_write.get(path, -1) > position:
+            block["content"] = f"[Earlier read of {path} omitted: the file was read or changed again later in the conversation.]"
+            changed = True
+    return changed
+
+def truncate_stale_results(conversation_history, before_index):
+    # Returns whether any result was cut
+    changed = False
+    for i, block, name, tool_input in tool_results_with_calls(conversation_history):
+        content = block.get("content")
+        if i >= before_index or is_compacted(content):
+            continue
+        if isinstance(content, str) and len(content) > STALE_TOOL_RESULT_CHARS:
+            block["content"] = (
+                content[:STALE_TOOL_RESULT_CHARS]
+                + f"\n[... {len(content) - STALE_TOOL_RESULT_CHARS} characters of this old {name} result omitted]"
+            )
+            changed = True
+    return changed
+
+async def compact_history(conversation_history, budget=CONTEXT_TOKEN_BUDGET, summarize=None):
+    """Shrink conversation_history in place once it goes over budget; returns True if anything changed.
+
+    Compaction brings the history down to CONTEXT_COMPACT_TARGET of the budget rather than just
+    under it, so it happens rarely and the cached prompt prefix stays valid in between.
+    """
+    if history_tokens(conversation_history) <= budget:
+        return False
+    target = int(budget * CONTEXT_COMPACT_TARGET)
+
+    # Over budget is not enough: the caller checkpoints the session whenever this returns True
+    changed = collapse_superseded_reads(conversation_history)
+    if history_tokens(conversation_history) <= target:
+        return changed
+
+    starts = turn_starts(conversation_history)
+    if len(starts) <= CONTEXT_KEEP_RECENT_TURNS:
+        return changed
+    recent_start = starts[-CONTEXT_KEEP_RECENT_TURNS]
+
+    changed = truncate_stale_results(conversation_history, recent_start) or changed
+    total = history_tokens(conversation_history)
+    if total <= target:
+        return changed
+
+    # Drop (or summarize) whole turns from the front until the rest fits
+    cut = 0
+    for start in starts[1:]:
+        if start > recent_start or total <= target:
+            break
+        total -= sum(message_tokens(message) for message in conversation_history[cut:start])
+        cut = start
+    if cut == 0:
+        return changed
+
+    removed = conversation_history[:cut]
+    del conversation_history[:cut]
+    if summarize is not None:
+        summary = await summarize(removed)
+        if summary:
+            conversation_history.insert(0, {
+                "role": "user",
+                "content": f"[Summary of the earlier part of this conversation]\n{summary}"
+            })
+    return True
+
+def image_placeholder(block, turns_ago):
+    size_kb = len(block_field(block, "source", {}).get("data", "")) * 3 // 4 // 1024
+    return {
+        "type": "text",
+        "text": f"[Image omitted from this request: it was attached {turns_ago} turn(s) ago ({size_kb} KB). Ask the user to attach it again if you need to look at it.]"
+    }
+
+def prune_images(conversation_history, keep_turns=IMAGE_KEEP_TURNS, byte_budget=IMAGE_BYTE_BUDGET):
+    """Return a copy of the history for sending, with old or over-budget images replaced by placeholders.
+
+    The history itself (and so the session store) keeps the original images.
+    """
+    pruned = []
+    turns_ago = 0
+    image_bytes = 0
+    # Walk newest to oldest so the most recent images are the ones that fit in the budget
+    for message in reversed(conversation_history):
+        content = message.get("content")
+        if not isinstance(content, str) and content:
+            blocks = []
+            changed = False
+            for block in reversed(content):
+                if block_field(block, "type") == "image":
+                    size = len(block_field(block, "source", {}).get("data", ""))
+                    if turns_ago >= keep_turns or image_bytes + size > byte_budget:
+                        block = image_placeholder(block, turns_ago)
+                        changed = True
+                    else:
+                        image_bytes += size
+                blocks.append(block)
+            if changed:
+                message = {"role": message["role"], "content": list(reversed(blocks))}
+        pruned.append(message)
+        if is_turn_start(message):
+            turns_ago += 1
+    pruned.reverse()
+    return pruned
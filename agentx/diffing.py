@@ -0,0 +1,147 @@
+# diffing.py
+
+from difflib import SequenceMatcher, Match
+from agentx.config import DIFF_MAX_BYTES, DIFF_FALLBACK_CELLS
+
+def intern_lines(a, b):
+    # Lines become small integers so every comparison below is an int compare, not a string compare
+    ids = {}
+    return [ids.setdefault(line, len(ids)) for line in a], [ids.setdefault(line, len(ids)) for line in b]
+
+def unique_positions(seq, lo, hi):
+    seen = {}
+    for i in range(lo, hi):
+        seen[seq[i]] = i if seq[i] not in seen else -1
+    return {value: i for value, i in seen.items() if i >= 0}
+
+def longest_increasing(pairs):
+    # Patience sorting: longest run of anchors that appear in the same order in both files
+    tails = []
+    tail_indexes = []
+    previous = [None] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tails[mid] < j:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(tails):
+            tails.append(j)
+            tail_indexes.append(index)
+        else:
+            tails[lo] = j
+            tail_indexes[lo] = index
+        previous[index] = tail_indexes[lo - 1] if lo > 0 else None
+    result = []
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        result.append(pairs[index])
+        index = previous[index]
+    result.reverse()
+    return result
+
+def matching_blocks(a, b):
+    """Patience diff over interned lines; returns difflib-style matching blocks."""
+    matches = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        # Common prefix and suffix are matched directly, which covers most edits in linear time
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            matches.append((alo, blo))
+            alo += 1
+            blo += 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+            matches.append((ahi, bhi))
+        if alo == ahi or blo == bhi:
+            continue
+
+        unique_a = unique_positions(a, alo, ahi)
+        unique_b = unique_positions(b, blo, bhi)
+        pairs = sorted((i, unique_b[value]) for value, i in unique_a.items() if value in unique_b)
+        anchors = longest_increasing(pairs)
+        if anchors:
+            previous_i, previous_j = alo, blo
+            for i, j in anchors:
+                matches.append((i, j))
+                stack.append((previous_i, i, previous_j, j))
+                previous_i, previous_j = i + 1, j + 1
+            stack.append((previous_i, ahi, previous_j, bhi))
+        elif (ahi - alo) * (bhi - blo) <= DIFF_FALLBACK_CELLS:
+            # No unique lines to anchor on (e.g. repeated boilerplate); the range is small enough for difflib
+            matcher = SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+            for i, j, size in matcher.get_matching_blocks():
+                for k in range(size):
+                    matches.append((alo + i + k, blo + j + k))
+        # Otherwise the range is reported as a plain replacement
+
+    matches.sort()
+    blocks = []
+    for i, j in matches:
+        if blocks and blocks[-1][0] + blocks[-1][2] == i and blocks[-1][1] + blocks[-1][2] == j:
+            blocks[-1][2] += 1
+        else:
+            blocks.append([i, j, 1])
+    return [Match(i, j, size) for i, j, size in blocks] + [Match(len(a), len(b), 0)]
+
+class PatienceMatcher(SequenceMatcher):
+    # SequenceMatcher's opcode grouping and formatting helpers, fed by the patience matcher
+    def __init__(self, a, b):
+        super().__init__(None, a, b, autojunk=False)
+
+    def get_matching_blocks(self):
+        if self.matching_blocks is None:
+            self.matching_blocks = matching_blocks(self.a, self.b)
+        return self.matching_blocks
+
+def format_range(start, stop):
+    length = stop - start
+    beginning = start + 1
+    if length == 0:
+        beginning -= 1
+    if length == 1:
+        return f"{beginning}"
+    return f"{beginning},{length}"
+
+def diff_lines(original_content, new_content, path, context=3):
+    """Return (unified diff lines, hunk count, lines added, lines removed)."""
+    a_lines = original_content.splitlines(keepends=True)
+    b_lines = new_content.splitlines(keepends=True)
+    a, b = intern_lines(a_lines, b_lines)
+    output = []
+    hunks = added = removed = 0
+    for group in PatienceMatcher(a, b).get_grouped_opcodes(context):
+        if not output:
+            output.extend([f"--- a/{path}\n", f"+++ b/{path}\n"])
+        hunks += 1
+        first, last = group[0], group[-1]
+        output.append(f"@@ -{format_range(first[1], last[2])} +{format_range(first[3], last[4])} @@\n")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                output.extend(" " + line for line in a_lines[i1:i2])
+                continue
+            if tag in ("replace", "delete"):
+                output.extend("-" + line for line in a_lines[i1:i2])
+                removed += i2 - i1
+            if tag in ("replace", "insert"):
+                output.extend("+" + line for line in b_lines[j1:j2])
+                added += j2 - j1
+    return [line if line.endswith("\n") else line + "\n\\ No newline at end of file\n" for line in output], hunks, added, removed
+
+def summarize_change(original_content, new_content, path, show_diff=False):
+    """Describe the change from original_content to new_content; None means nothing changed."""
+    if original_content == new_content:
+        return None
+    if len(original_content) > DIFF_MAX_BYTES or len(new_content) > DIFF_MAX_BYTES:
+        old_count = original_content.count("\n")
+        new_count = new_content.count("\n")
+        return f"{old_count} lines before, {new_count} lines after (file too large to diff)"
+    lines, hunks, added, removed = diff_lines(original_content, new_content, path)
+    summary = f"{hunks} hunk{'s' if hunks != 1 else ''}, +{added} -{removed} lines"
+    if show_diff:
+        return summary + "\n" + "".join(lines)
+    return summary
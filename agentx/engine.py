@@ -0,0 +1,329 @@
+# engine.py
+
+import os
+import time
+import signal
+import asyncio
+import threading
+from agentx.utils import update_system_prompt, session_status, print_colored
+from agentx.images import encode_image
+from agentx.tools import tools, aexecute_tool
+from agentx.executor import aexecute_tools
+from agentx.render import StreamRenderer, truncate_output
+from agentx.context import compact_history, prune_images, block_field
+from agentx.journal import Journal, current_journal
+from agentx.cassette import get_cassette
+from agentx.trace import TurnTrace, usage_fields
+from agentx.store import new_session_id
+from agentx.scheduler import stream_message, with_retries
+from agentx.config import CONTINUATION_EXIT_PHRASE, TOOL_COLOR, RESULT_COLOR, CONTEXT_SUMMARIZE, RETRY_MAX_ATTEMPTS, MODEL_READ_TIMEOUT
+
+# The client (and the anthropic package, the slowest import of the CLI) is created on first use
+_client = None
+_client_lock = threading.Lock()
+
+# Turns that are not part of a saved session are traced under one id per process
+_process_session_id = None
+
+# One event loop for the whole CLI process, so the pooled HTTP connections of the async client survive between turns
+_loop = None
+
+def content_blocks(content):
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}]
+    return list(content)
+
+def build_messages(conversation_history):
+    # Ensure that roles alternate between "user" and "assistant"
+    messages = []
+    for msg in conversation_history:
+        if msg.get('content'):
+            if len(messages) == 0 or messages[-1]['role'] != msg['role']:
+                messages.append(msg)
+            else:
+                # Merge consecutive messages from the same role into one, without touching the history
+                messages[-1] = {
+                    "role": msg['role'],
+                    "content": content_blocks(messages[-1]['content']) + content_blocks(msg['content'])
+                }
+    return messages
+
+def mark_cache_breakpoint(messages):
+    # Caches the conversation up to the newest message, so follow-up requests in the
+    # tool loop only pay full price for the tool results added since the last one
+    if not messages:
+        return messages
+    last = messages[-1]
+    blocks = content_blocks(last["content"])
+    if not blocks or not isinstance(blocks[-1], dict):
+        return messages
+    blocks[-1] = {**blocks[-1], "cache_control": {"type": "ephemeral"}}
+    return messages[:-1] + [{"role": last["role"], "content": blocks}]
+
+def append_status(messages, status):
+    # Added after the cache breakpoint, so the per-iteration status does not change the cached prefix
+    if not messages or messages[-1]["role"] != "user":
+        return messages
+    last = messages[-1]
+    return messages[:-1] + [{"role": "user", "content": content_blocks(last["content"]) + [{"type": "text", "text": status}]}]
+
+def balance_history(conversation_history):
+    # A cancelled or crashed turn can leave tool calls without results, which the API rejects on the next request
+    if not conversation_history or conversation_history[-1]["role"] != "assistant":
+        return
+    content = conversation_history[-1]["content"]
+    if isinstance(content, str):
+        return
+    pending = [block_field(block, "id") for block in content if block_field(block, "type") == "tool_use"]
+    if pending:
+        conversation_history.append({
+            "role": "user",
+            "content": [
+                {"type": "tool_result", "tool_use_id": tool_use_id, "content": "Tool call was interrupted before it returned a result."}
+                for tool_use_id in pending
+            ]
+        })
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            from anthropic import AsyncAnthropic, Timeout
+            # Retries are left to the scheduler, which also covers streams that break part way
+            options = {"max_retries": 0, "timeout": Timeout(600, connect=10, read=MODEL_READ_TIMEOUT)}
+            cassette = get_cassette()
+            if cassette is None:
+                _client = AsyncAnthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"), **options)
+            else:
+                # Traffic goes through the cassette; a replay needs no real key
+                api_key = os.environ.get("ANTHROPIC_API_KEY") or ("replay" if cassette.mode == "replay" else None)
+                _client = AsyncAnthropic(api_key=api_key, http_client=cassette.async_http_client(), **options)
+        return _client
+
+def trace_session_id(store):
+    global _process_session_id
+    if store is not None:
+        return store.session_id
+    if _process_session_id is None:
+        _process_session_id = new_session_id()
+    return _process_session_id
+
+async def summarize_messages(messages):
+    # Used by context compaction to fold dropped turns into a short recap
+    response = await with_retries(lambda: get_client().messages.create(
+        model="claude-3-5-sonnet-20240620",
+        max_tokens=1000,
+        system="You condense earlier parts of a coding session so it can continue without them.",
+        messages=build_messages(messages) + [{
+            "role": "user",
+            "content": "Summarize the conversation so far in a few short paragraphs: the user's goals, decisions made, files created or changed, and anything still left to do."
+        }]
+    ))
+    return "".join(block.text for block in response.content if block.type == "text")
+
+async def achat_with_claude(user_input, image_path, conversation_history, automode, current_iteration=None, max_iterations=None, renderer=None, store=None, listener=None):
+    """Runs one turn: streams the response through renderer, runs the tools it calls and
+    streams the follow-ups. listener, when given, is called with ("tool_use", ...),
+    ("tool_result", ...) and ("retry", ...) events as the turn goes, for callers that
+    present the turn somewhere other than a terminal."""
+    # A session resumed after a crash or kill mid-tool can end in tool calls without results,
+    # which the API rejects on every later request
+    balance_history(conversation_history)
+    if image_path:
+        print_colored(f"Processing image at path: {image_path}", TOOL_COLOR)
+        try:
+            image_base64, media_type = await asyncio.to_thread(encode_image, image_path)
+        except Exception as e:
+            print_colored(f"Error encoding image: {str(e)}", TOOL_COLOR)
+            return "I'm sorry, there was an error processing the image. Please try again.", False
+
+        image_message = {
+            "role": "user",
+            "content": [
+                {
+                    "type": "image",
+                    "source": {
+                        "type": "base64",
+                        "media_type": media_type,
+                        "data": image_base64
+                    }
+                },
+                {
+                    "type": "text",
+                    "text": f"User input for image: {user_input}"
+                }
+            ]
+        }
+        conversation_history.append(image_message)
+        print_colored("Image message added to conversation history", TOOL_COLOR)
+    else:
+        conversation_history.append({"role": "user", "content": user_input})
+
+    cassette = get_cassette()
+    if cassette is not None:
+        cassette.record_turn(user_input=user_input, image_path=image_path, automode=automode, current_iteration=current_iteration, max_iterations=max_iterations)
+
+    if store is not None:
+        store.sync(conversation_history)
+        # File writes made by this turn's tools go into the session's undo journal
+        journal = Journal(store.session_id)
+        journal.turn = len(conversation_history)
+        current_journal.set(journal)
+
+    if renderer is None:
+        renderer = StreamRenderer()
+
+    trace = TurnTrace(trace_session_id(store), len(conversation_history), automode=automode, iteration=current_iteration)
+    status = "ok"
+
+    async def traced_execute_tool(tool_name, tool_input):
+        with trace.span("tool", tool=tool_name, request=request) as span:
+            result = await aexecute_tool(tool_name, tool_input)
+            span["error"] = str(result).startswith("Error")
+            return result
+
+    def on_text(text):
+        nonlocal assistant_response
+        with trace.accumulate("render"):
+            renderer.feed(text)
+        assistant_response += text
+
+    def on_event(event):
+        # Keep frames going out while the model streams tool input instead of text
+        with trace.accumulate("render"):
+            renderer.tick()
+
+    def on_retry(kind, attempt, delay, error, started):
+        with trace.accumulate("render"):
+            renderer.close()
+            print_colored(f"Model request failed ({kind}: {str(error)[:200]}); retrying in {delay:.1f}s, attempt {attempt + 1} of {RETRY_MAX_ATTEMPTS}", TOOL_COLOR)
+        trace.add("retry", started, time.perf_counter() - started + delay, request=request, kind=kind, attempt=attempt)
+        if listener is not None:
+            listener("retry", {"kind": kind, "attempt": attempt, "delay": round(delay, 3), "error": str(error)[:200]})
+
+    assistant_response = ""
+    exit_continuation = False
+    request = 0
+
+    try:
+
+        # Agent loop: stream a response, run every tool call it made, and stream the
+        # follow-up until the model stops asking for tools
+        while True:
+            with trace.span("build", request=request):
+                compacted = await compact_history(conversation_history, summarize=summarize_messages if CONTEXT_SUMMARIZE else None)
+                if compacted and store is not None:
+                    store.checkpoint(conversation_history)
+                system = update_system_prompt()
+                messages = mark_cache_breakpoint(build_messages(prune_images(conversation_history)))
+                messages = append_status(messages, session_status(current_iteration, max_iterations, automode))
+
+            # Transient API failures are retried here; a stream that breaks part way is resumed
+            final_message, attempt = await stream_message(get_client(), {
+                "model": "claude-3-5-sonnet-20240620",
+                "max_tokens": 4000,
+                "system": system,
+                "messages": messages,
+                "tools": tools,
+                "tool_choice": {"type": "auto"}
+            }, on_text, on_event, on_retry)
+            with trace.accumulate("render"):
+                renderer.close()
+            if CONTINUATION_EXIT_PHRASE in assistant_response:
+                exit_continuation = True
+            trace.add("ttft", attempt["sent"], attempt["first_token"] - attempt["sent"], request=request)
+            trace.add("stream", attempt["first_token"], time.perf_counter() - attempt["first_token"], request=request,
+                      stop_reason=final_message.stop_reason, attempts=attempt["attempts"], hedged=attempt["hedged"],
+                      render=round(trace.total("render"), 6), **usage_fields(final_message.usage))
+
+            conversation_history.append({"role": "assistant", "content": final_message.content})
+            if store is not None:
+                store.sync(conversation_history)
+
+            tool_uses = [block for block in final_message.content if block.type == "tool_use"]
+            if final_message.stop_reason != "tool_use" or not tool_uses:
+                trace.flush_total("render", request=request)
+                break
+
+            with trace.accumulate("render"):
+                for tool_use in tool_uses:
+                    print_colored(f"\nTool Used: {tool_use.name}", TOOL_COLOR)
+                    print_colored(f"Tool Input: {truncate_output(tool_use.input)}", TOOL_COLOR)
+                    if listener is not None:
+                        listener("tool_use", {"id": tool_use.id, "name": tool_use.name, "input": tool_use.input})
+
+            # Independent tool calls run concurrently, results come back in call order
+            with trace.span("tools", request=request, calls=len(tool_uses)):
+                tool_results = await aexecute_tools(tool_uses, traced_execute_tool)
+            with trace.accumulate("render"):
+                for tool_result in tool_results:
+                    print_colored(f"Tool Result: {truncate_output(tool_result['content'])}", RESULT_COLOR)
+                    if listener is not None:
+                        listener("tool_result", {"tool_use_id": tool_result["tool_use_id"], "content": truncate_output(tool_result["content"])})
+            trace.flush_total("render", request=request)
+
+            conversation_history.append({"role": "user", "content": tool_results})
+            if store is not None:
+                store.sync(conversation_history)
+            request += 1
+
+    except asyncio.CancelledError:
+        status = "cancelled"
+        renderer.close()
+        balance_history(conversation_history)
+        if store is not None:
+            store.sync(conversation_history)
+        raise
+    except Exception as e:
+        status = "error"
+        renderer.close()
+        print_colored(f"Error calling Claude API: {str(e)}", TOOL_COLOR)
+        return "I'm sorry, there was an error communicating with the AI. Please try again.", False
+    finally:
+        trace.finish(status)
+
+    return "", exit_continuation  # Return empty string to avoid reprinting the response
+
+def get_event_loop():
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop
+
+def run_turn(coro):
+    # Runs one turn as its own task; Ctrl+C cancels just that task and then propagates as usual.
+    # Like asyncio.Runner, the interrupt is handled by the loop: raised inside the task's own
+    # code it would skip the cancellation cleanup that keeps the history balanced
+    loop = get_event_loop()
+    task = loop.create_task(coro)
+    interrupted = False
+
+    def interrupt():
+        nonlocal interrupted
+        interrupted = True
+        task.cancel()
+
+    try:
+        loop.add_signal_handler(signal.SIGINT, interrupt)
+        handled = True
+    except (NotImplementedError, RuntimeError, ValueError):
+        # No loop signal handlers on Windows or outside the main thread
+        handled = False
+    try:
+        result = loop.run_until_complete(task)
+    except asyncio.CancelledError:
+        if not interrupted:
+            raise
+    except KeyboardInterrupt:
+        task.cancel()
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        raise
+    finally:
+        if handled:
+            loop.remove_signal_handler(signal.SIGINT)
+    if interrupted:
+        raise KeyboardInterrupt
+    return result
@@ -0,0 +1,127 @@
+# executor.py
+
+import os
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from agentx.config import MAX_TOOL_WORKERS
+
+# Tools that never modify the workspace and can safely run side by side
+READ_ONLY_TOOLS = {"read_file", "list_files", "search_code", "find_symbol", "tavily_search", "searxng_search", "multi_search"}
+
+# Tools that take a folder and default to the workspace root
+FOLDER_TOOLS = ("list_files", "search_code", "find_symbol")
+
+# The folder relative tool paths are resolved against. Sessions working somewhere other than
+# the process's current directory (batch tasks, server sessions) set it for their turns;
+# asyncio.to_thread carries it over to the tool threads
+current_workspace = contextvars.ContextVar("current_workspace", default=None)
+
+def workspace_root():
+    return current_workspace.get() or os.getcwd()
+
+def resolve_path(path):
+    return os.path.abspath(os.path.join(workspace_root(), path))
+
+def in_workspace(tool_name, tool_input):
+    # Tool input with its paths made absolute, when the session has a workspace of its own
+    if current_workspace.get() is None or not isinstance(tool_input, dict):
+        return tool_input
+    if "path" in tool_input:
+        return dict(tool_input, path=resolve_path(tool_input["path"]))
+    if tool_name in FOLDER_TOOLS:
+        return dict(tool_input, path=workspace_root())
+    return tool_input
+
+def tool_path(tool_name, tool_input):
+    if not isinstance(tool_input, dict):
+        return None
+    if tool_name in FOLDER_TOOLS:
+        return resolve_path(tool_input.get("path", "."))
+    if "path" in tool_input:
+        return resolve_path(tool_input["path"])
+    return None
+
+def paths_overlap(a, b):
+    if a is None or b is None:
+        return False
+    if a == b:
+        return True
+    return a.startswith(b.rstrip(os.sep) + os.sep) or b.startswith(a.rstrip(os.sep) + os.sep)
+
+def calls_conflict(earlier, later):
+    # Two calls must stay ordered when at least one of them writes and they touch the same path
+    # (or one path lives inside the other, e.g. create_folder followed by create_file in it)
+    if earlier["read_only"] and later["read_only"]:
+        return False
+    return paths_overlap(earlier["path"], later["path"])
+
+def describe_calls(tool_uses):
+    return [
+        {
+            "id": tool_use.id,
+            "name": tool_use.name,
+            "input": tool_use.input,
+            "read_only": tool_use.name in READ_ONLY_TOOLS,
+            "path": tool_path(tool_use.name, tool_use.input),
+        }
+        for tool_use in tool_uses
+    ]
+
+def tool_result_blocks(calls, results):
+    return [
+        {
+            "type": "tool_result",
+            "tool_use_id": call["id"],
+            "content": str(result)
+        }
+        for call, result in zip(calls, results)
+    ]
+
+def execute_tools(tool_uses, execute, max_workers=MAX_TOOL_WORKERS):
+    """Run the tool_use blocks of one assistant turn and return their tool_result blocks in order."""
+    calls = describe_calls(tool_uses)
+
+    def run(call, dependencies):
+        # Dependencies were submitted earlier, so the FIFO pool has already picked them up
+        wait(dependencies)
+        try:
+            return execute(call["name"], call["input"])
+        except Exception as e:
+            return f"Error executing tool {call['name']}: {str(e)}"
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(calls) or 1))) as pool:
+        for i, call in enumerate(calls):
+            dependencies = [futures[j] for j in range(i) if calls_conflict(calls[j], call)]
+            futures.append(pool.submit(run, call, dependencies))
+
+    return tool_result_blocks(calls, [future.result() for future in futures])
+
+async def aexecute_tools(tool_uses, execute, max_workers=MAX_TOOL_WORKERS):
+    """Async counterpart of execute_tools, where execute is a coroutine function."""
+    calls = describe_calls(tool_uses)
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def run(call, dependencies):
+        if dependencies:
+            await asyncio.wait(dependencies)
+        async with semaphore:
+            try:
+                return await execute(call["name"], call["input"])
+            except Exception as e:
+                return f"Error executing tool {call['name']}: {str(e)}"
+
+    tasks = []
+    for i, call in enumerate(calls):
+        dependencies = [tasks[j] for j in range(i) if calls_conflict(calls[j], call)]
+        tasks.append(asyncio.ensure_future(run(call, dependencies)))
+
+    try:
+        results = await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    return tool_result_blocks(calls, results)
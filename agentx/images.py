@@ -0,0 +1,137 @@
+# images.py
+
+import os
+import io
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from agentx.config import AGENTX_HOME, IMAGE_MAX_SIZE, IMAGE_JPEG_QUALITY, IMAGE_CACHE_ENTRIES, IMAGE_CACHE_DISK_BYTES
+
+IMAGE_CACHE_DIR = os.path.join(AGENTX_HOME, "image-cache")
+
+MEDIA_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "GIF": "image/gif", "WEBP": "image/webp"}
+EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/gif": "gif", "image/webp": "webp"}
+
+# Encoded payloads by (path, size, mtime), so re-attaching the same file never touches the disk
+_memory_cache = OrderedDict()
+_pending = {}
+_lock = threading.Lock()
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="agentx-image")
+
+def file_key(image_path):
+    stat = os.stat(image_path)
+    return (os.path.abspath(image_path), stat.st_size, stat.st_mtime_ns)
+
+def remember(key, payload):
+    with _lock:
+        _memory_cache[key] = payload
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > IMAGE_CACHE_ENTRIES:
+            _memory_cache.popitem(last=False)
+
+def disk_cache_path(digest, media_type):
+    return os.path.join(IMAGE_CACHE_DIR, f"{digest}.{EXTENSIONS[media_type]}")
+
+def read_disk_cache(digest):
+    for media_type in EXTENSIONS:
+        path = disk_cache_path(digest, media_type)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        # Touch on hit so eviction drops the least recently used entries
+        os.utime(path)
+        return data, media_type
+    return None
+
+def write_disk_cache(digest, data, media_type):
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    path = disk_cache_path(digest, media_type)
+    tmp_path = f"{path}.tmp{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    evict_disk_cache()
+
+def evict_disk_cache(max_bytes=IMAGE_CACHE_DISK_BYTES):
+    entries = []
+    total = 0
+    with os.scandir(IMAGE_CACHE_DIR) as it:
+        for entry in it:
+            if entry.is_file() and ".tmp" not in entry.name:
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def convert_image(raw):
+    # PIL is only loaded once an image is actually attached
+    from PIL import Image
+    with Image.open(io.BytesIO(raw)) as img:
+        source_format = img.format
+        # Small images in a format the API accepts are sent as they are
+        if source_format in MEDIA_TYPES and max(img.size) <= IMAGE_MAX_SIZE:
+            return raw, MEDIA_TYPES[source_format]
+
+        if source_format == "JPEG":
+            # Let the JPEG decoder scale down while decoding instead of decoding the full photo
+            img.draft("RGB", (IMAGE_MAX_SIZE, IMAGE_MAX_SIZE))
+        img.thumbnail((IMAGE_MAX_SIZE, IMAGE_MAX_SIZE), Image.LANCZOS)
+
+        output = io.BytesIO()
+        if source_format == "PNG":
+            # Screenshots stay PNG so text and UI edges stay sharp
+            img.save(output, format="PNG", optimize=False)
+            return output.getvalue(), "image/png"
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.save(output, format="JPEG", quality=IMAGE_JPEG_QUALITY)
+        return output.getvalue(), "image/jpeg"
+
+def load_image(image_path):
+    key = file_key(image_path)
+    with open(image_path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw + f":{IMAGE_MAX_SIZE}:{IMAGE_JPEG_QUALITY}".encode()).hexdigest()
+    cached = read_disk_cache(digest)
+    if cached is None:
+        data, media_type = convert_image(raw)
+        write_disk_cache(digest, data, media_type)
+    else:
+        data, media_type = cached
+    payload = (base64.b64encode(data).decode("utf-8"), media_type)
+    remember(key, payload)
+    return payload
+
+def prefetch_image(image_path):
+    # Starts encoding in the background, e.g. while the user is still typing the prompt
+    try:
+        key = file_key(image_path)
+    except OSError:
+        return
+    with _lock:
+        if key in _memory_cache or key in _pending:
+            return
+        _pending[key] = _pool.submit(load_image, image_path)
+
+def encode_image(image_path):
+    """Return (base64 data, media type) for image_path, using the in-memory and on-disk caches."""
+    key = file_key(image_path)
+    with _lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+        future = _pending.pop(key, None)
+    if future is not None:
+        return future.result()
+    return load_image(image_path)
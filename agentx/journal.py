@@ -0,0 +1,175 @@
+# journal.py
+
+import os
+import json
+import gzip
+import time
+import uuid
+import errno
+import shutil
+import contextvars
+from agentx.config import AGENTX_HOME
+
+JOURNAL_DIR = os.path.join(AGENTX_HOME, "journal")
+
+# FICLONE ioctl: copy-on-write clone on filesystems that support it (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+# The journal of the session whose tools are running; a context variable so concurrent
+# sessions in one process (and the worker threads they start) each see their own
+current_journal = contextvars.ContextVar("current_journal", default=None)
+
+def write_atomic(path, content, newline=None):
+    # Write to a temporary file next to the target and rename it into place, so the target
+    # is always either the old or the new version, never a truncated one. A symlink is written
+    # through, like open(path, "w") would: renaming onto the link would replace the link itself
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{uuid.uuid4().hex[:8]}.tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with (os.fdopen(fd, "wb") if isinstance(content, bytes) else os.fdopen(fd, "w", newline=newline)) as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def reflink(source, target):
+    import fcntl
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+class Journal:
+    """Per-session undo journal of file writes made by the tools.
+
+    Before a file is replaced its old version is kept: as a hardlink to the old inode when
+    possible (the atomic rename leaves that inode untouched), else as a reflink, else as a
+    gzip copy. Entries are appended to journal.jsonl; undo replays them newest first.
+    """
+
+    def __init__(self, session_id, root=JOURNAL_DIR):
+        self.session_id = session_id
+        self.directory = os.path.join(root, session_id)
+        self.log_path = os.path.join(self.directory, "journal.jsonl")
+        self.turn = None
+
+    def append(self, record):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def keep_old_version(self, path, name):
+        backup = os.path.join(self.directory, name)
+        try:
+            os.link(path, backup)
+            return name, "hardlink"
+        except OSError:
+            pass
+        try:
+            reflink(path, backup)
+            return name, "reflink"
+        except (OSError, ImportError):
+            if os.path.exists(backup):
+                os.remove(backup)
+        with open(path, "rb") as src, gzip.open(backup + ".gz", "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst)
+        return name + ".gz", "gzip"
+
+    def record_write(self, path):
+        path = os.path.abspath(path)
+        entry_id = uuid.uuid4().hex[:12]
+        record = {"op": "write", "id": entry_id, "path": path, "turn": self.turn, "time": time.time(), "backup": None, "method": None}
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.isfile(path):
+            record["backup"], record["method"] = self.keep_old_version(path, entry_id)
+        self.append(record)
+
+    def record_mkdir(self, path):
+        path = os.path.abspath(path)
+        if not os.path.exists(path):
+            self.append({"op": "mkdir", "id": uuid.uuid4().hex[:12], "path": path, "turn": self.turn, "time": time.time()})
+
+    def entries(self):
+        if not os.path.exists(self.log_path):
+            return []
+        records = []
+        undone = set()
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record["op"] == "undo":
+                    undone.add(record["id"])
+                else:
+                    records.append(record)
+        return [record for record in records if record["id"] not in undone]
+
+    def restore(self, record):
+        path = record["path"]
+        if record["op"] == "mkdir":
+            try:
+                os.rmdir(path)
+            except OSError as e:
+                if e.errno not in (errno.ENOENT, errno.ENOTEMPTY, errno.EEXIST):
+                    raise
+            return f"Removed folder {path}" if not os.path.exists(path) else f"Kept non-empty folder {path}"
+        if record["backup"] is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return f"Removed {path}"
+        backup = os.path.join(self.directory, record["backup"])
+        opener = gzip.open if record["method"] == "gzip" else open
+        with opener(backup, "rb") as f:
+            content = f.read()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, content)
+        return f"Restored {path}"
+
+    def undo(self, steps=None, whole_session=False):
+        entries = self.entries()
+        if not entries:
+            return []
+        if whole_session:
+            selected = entries
+        elif steps:
+            selected = entries[-steps:]
+        else:
+            last_turn = entries[-1]["turn"]
+            selected = [record for record in entries if record["turn"] == last_turn]
+        messages = []
+        for record in reversed(selected):
+            messages.append(self.restore(record))
+            self.append({"op": "undo", "id": record["id"], "time": time.time()})
+        return messages
+
+def safe_write(path, content, newline=None):
+    # Journaled under the file actually written, so undo restores the link's target
+    path = os.path.realpath(path)
+    journal = current_journal.get()
+    if journal is not None:
+        journal.record_write(path)
+    write_atomic(path, content, newline)
+
+def safe_mkdir(path):
+    journal = current_journal.get()
+    if journal is not None:
+        journal.record_mkdir(path)
+    os.makedirs(path, exist_ok=True)
+
+def latest_journal(root=JOURNAL_DIR):
+    if not os.path.isdir(root):
+        return None
+    sessions = [
+        (os.path.getmtime(os.path.join(root, name, "journal.jsonl")), name)
+        for name in os.listdir(root)
+        if os.path.exists(os.path.join(root, name, "journal.jsonl"))
+    ]
+    return Journal(max(sessions)[1], root) if sessions else None
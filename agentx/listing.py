@@ -0,0 +1,168 @@
+# listing.py
+
+import os
+import re
+import fnmatch
+from functools import lru_cache
+from agentx.config import LIST_FILES_MAX_ENTRIES, LIST_FILES_PATTERN_DEPTH, ALWAYS_IGNORED_DIRS
+
+# Directory contents by path, reused while the directory's mtime is unchanged
+# (adding, removing or renaming an entry updates the mtime of its directory)
+_dir_cache = {}
+_ignore_cache = {}
+
+def scan_dir(path):
+    mtime = os.stat(path).st_mtime_ns
+    cached = _dir_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            entries.append((entry.name, is_dir))
+    entries.sort(key=lambda item: (not item[1], item[0].lower()))
+    _dir_cache[path] = (mtime, entries)
+    return entries
+
+@lru_cache(maxsize=256)
+def glob_regex(pattern):
+    # fnmatch, except that "**/" stands for zero or more folders, so src/**/*.py also matches
+    # src/main.py; it is swapped out first because fnmatch.translate folds ** into a single *
+    return fnmatch.translate(pattern.replace("**/", "\0")).replace("\0", "(?:.*/)?")
+
+def match_glob(relative, pattern):
+    # Patterns without a slash match the file name, others the path relative to the search root
+    name = relative if "/" in pattern else relative.rsplit("/", 1)[-1]
+    return re.match(glob_regex(pattern), name) is not None
+
+def compile_ignore_pattern(pattern):
+    # Minimal .gitignore semantics: negation, directory-only patterns, anchoring and **
+    negate = pattern.startswith("!")
+    if negate:
+        pattern = pattern[1:]
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    regex = glob_regex(pattern)
+    if not anchored:
+        regex = r"(?:.*/)?" + regex
+    return re.compile(regex), negate, dir_only
+
+def read_ignore_file(directory):
+    path = os.path.join(directory, ".gitignore")
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return []
+    cached = _ignore_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    rules = []
+    with open(path, "r", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n").rstrip()
+            if line and not line.startswith("#"):
+                rules.append(compile_ignore_pattern(line))
+    _ignore_cache[path] = (mtime, rules)
+    return rules
+
+def is_ignored(rule_sets, path, is_dir):
+    # rule_sets: (base directory, rules) pairs from the root down; the last matching rule wins
+    ignored = False
+    for base, rules in rule_sets:
+        relative = os.path.relpath(path, base).replace(os.sep, "/")
+        for regex, negate, dir_only in rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(relative):
+                ignored = not negate
+    return ignored
+
+def count_entries(path, rule_sets=None):
+    # With rule_sets, only the entries list_files would show are counted
+    try:
+        entries = scan_dir(path)
+    except OSError:
+        return 0
+    if rule_sets is None:
+        return len(entries)
+    rule_sets = rule_sets + [(path, read_ignore_file(path))]
+    return sum(
+        1 for name, is_dir in entries
+        if not (is_dir and name in ALWAYS_IGNORED_DIRS) and not is_ignored(rule_sets, os.path.join(path, name), is_dir)
+    )
+
+def iter_files(root):
+    # Every file under root that list_files would show, as (full path, relative path) pairs
+    stack = [(os.path.abspath(root), [])]
+    while stack:
+        directory, rule_sets = stack.pop()
+        rule_sets = rule_sets + [(directory, read_ignore_file(directory))]
+        try:
+            entries = scan_dir(directory)
+        except OSError:
+            continue
+        for name, is_dir in entries:
+            full_path = os.path.join(directory, name)
+            if is_dir:
+                if name not in ALWAYS_IGNORED_DIRS and not is_ignored(rule_sets, full_path, True):
+                    stack.append((full_path, rule_sets))
+            elif not is_ignored(rule_sets, full_path, False):
+                yield full_path, os.path.relpath(full_path, root).replace(os.sep, "/")
+
+def list_files(path=".", depth=None, pattern=None, max_entries=LIST_FILES_MAX_ENTRIES):
+    try:
+        root = os.path.abspath(path)
+        # Name searches look through the whole tree unless told otherwise
+        depth = max(1, int(depth or (LIST_FILES_PATTERN_DEPTH if pattern else 1)))
+        lines = []
+        totals = {"dirs": 0, "files": 0}
+        truncated = False
+
+        def walk(directory, level, rule_sets):
+            nonlocal truncated
+            rule_sets = rule_sets + [(directory, read_ignore_file(directory))]
+            for name, is_dir in scan_dir(directory):
+                if len(lines) >= max_entries:
+                    truncated = True
+                    return
+                full_path = os.path.join(directory, name)
+                relative = os.path.relpath(full_path, root).replace(os.sep, "/")
+                indent = "  " * (level - 1)
+                if is_dir and (name in ALWAYS_IGNORED_DIRS or is_ignored(rule_sets, full_path, True)):
+                    if pattern is None:
+                        lines.append(f"{indent}{name}/ (ignored, {count_entries(full_path)} entries)")
+                    continue
+                if not is_dir and is_ignored(rule_sets, full_path, False):
+                    continue
+                if is_dir:
+                    totals["dirs"] += 1
+                    if level < depth:
+                        if pattern is None:
+                            lines.append(f"{indent}{name}/")
+                        walk(full_path, level + 1, rule_sets)
+                    elif pattern is None:
+                        lines.append(f"{indent}{name}/ ({count_entries(full_path, rule_sets)} entries)")
+                else:
+                    if pattern is None:
+                        totals["files"] += 1
+                        lines.append(f"{indent}{name}")
+                    elif match_glob(relative, pattern):
+                        totals["files"] += 1
+                        lines.append(relative)
+
+        walk(root, 1, [])
+    except Exception as e:
+        return f"Error listing files: {str(e)}"
+
+    header = f"[{path}: {totals['files']} files, {totals['dirs']} folders, depth {depth}"
+    if pattern is not None:
+        header += f", matching {pattern}"
+    if truncated:
+        header += f"; output truncated at {max_entries} entries, narrow it down with path, depth or pattern"
+    return header + "]\n" + "\n".join(lines)
@@ -0,0 +1,116 @@
+# render.py
+
+import sys
+import time
+from functools import lru_cache
+from agentx.config import RENDER_MODE, RENDER_FPS, TOOL_RESULT_MAX_LINES, TOOL_RESULT_MAX_CHARS
+
+FENCE = "```"
+
+# Pygments is imported on first use rather than at startup; loading its lexer registry
+# is a noticeable part of the CLI's start time
+@lru_cache(maxsize=64)
+def get_lexer(language):
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+    try:
+        return get_lexer_by_name(language)
+    except ClassNotFound:
+        return None
+
+@lru_cache(maxsize=1)
+def get_formatter():
+    from pygments.formatters import TerminalFormatter
+    return TerminalFormatter()
+
+def highlight_code(code, language):
+    lexer = get_lexer(language) if language else None
+    if lexer is None:
+        return code
+    from pygments import highlight
+    return highlight(code, lexer, get_formatter())
+
+def truncate_output(text, max_lines=TOOL_RESULT_MAX_LINES, max_chars=TOOL_RESULT_MAX_CHARS):
+    # Only the terminal view is shortened, the model still gets the full tool result
+    text = str(text)
+    lines = text.split("\n")
+    shown = "\n".join(lines[:max_lines])
+    if len(shown) > max_chars:
+        shown = shown[:max_chars]
+    if len(shown) == len(text):
+        return text
+    hidden_lines = len(lines) - shown.count("\n") - 1
+    return f"{shown}\n... ({hidden_lines} more lines, {len(text) - len(shown)} more characters not shown)"
+
+class StreamRenderer:
+    """Batches streamed text deltas into frames and highlights fenced code blocks line by line."""
+
+    def __init__(self, mode=RENDER_MODE, fps=RENDER_FPS, out=None):
+        self.out = out or sys.stdout
+        self.interval = 0 if mode == "instant" or fps <= 0 else 1.0 / fps
+        self.pending = ""
+        self.line = ""
+        self.mid_line = False
+        self.in_code = False
+        self.language = ""
+        self.last_flush = 0.0
+
+    def feed(self, text):
+        self.pending += text
+        self.tick()
+
+    def tick(self):
+        if self.pending and time.monotonic() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self, final=False):
+        frame = self.render(self.pending, final)
+        self.pending = ""
+        self.last_flush = time.monotonic()
+        if frame:
+            self.out.write(frame)
+            self.out.flush()
+
+    def close(self):
+        self.flush(final=True)
+        if self.mid_line:
+            self.out.write("\n")
+            self.out.flush()
+        self.mid_line = False
+
+    def render(self, text, final=False):
+        self.line += text
+        frame = []
+        while "\n" in self.line:
+            line, self.line = self.line.split("\n", 1)
+            frame.append(self.render_line(line) + "\n")
+            self.mid_line = False
+        if self.line and (final or self.can_emit_partial()):
+            frame.append(self.render_line(self.line))
+            self.line = ""
+            self.mid_line = True
+        return "".join(frame)
+
+    def can_emit_partial(self):
+        # Code lines are held until complete so they can be highlighted, and so is anything
+        # at the start of a line that might still turn into a fence
+        if self.in_code:
+            return False
+        if self.mid_line:
+            return True
+        stripped = self.line.lstrip()
+        return not (stripped.startswith("`") or FENCE.startswith(stripped))
+
+    def render_line(self, line):
+        stripped = line.strip()
+        if not self.mid_line and stripped.startswith(FENCE):
+            if self.in_code:
+                self.in_code = False
+                self.language = ""
+            else:
+                self.in_code = True
+                self.language = stripped[len(FENCE):].strip()
+            return line
+        if self.in_code and not self.mid_line:
+            return highlight_code(line, self.language).rstrip("\n")
+        return line
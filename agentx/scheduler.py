@@ -0,0 +1,219 @@
+# scheduler.py
+
+import os
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from agentx.config import RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY, RETRY_MAX_WAIT, HEDGE_AFTER
+
+# Failures worth another try, by HTTP status and by the error type of an SSE error event
+# (an overload in the middle of a stream arrives as an event on a 200 response)
+RETRYABLE_STATUS = {408: "timeout", 429: "rate_limit", 500: "server", 502: "server", 503: "server", 504: "server", 529: "overloaded"}
+RETRYABLE_ERROR_TYPES = {"rate_limit_error": "rate_limit", "overloaded_error": "overloaded", "api_error": "server"}
+
+# Stream events that carry output; the first one marks the time to first token
+TOKEN_EVENTS = ("text", "input_json")
+
+class IncompleteStream(ConnectionError):
+    """The response stream ended before its message_stop event."""
+
+def classify(error):
+    """Kind of a transient failure ("rate_limit", "overloaded", "server", "timeout" or
+    "connection"), or None when trying again cannot help (bad request, auth, ...)."""
+    # Matched by class name, so errors of httpx and httpx2 (the SDK has shipped on both) look alike
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if names & {"APITimeoutError", "TimeoutException"} or isinstance(error, TimeoutError):
+        return "timeout"
+    if names & {"APIConnectionError", "TransportError"} or isinstance(error, ConnectionError):
+        return "connection"
+    body = getattr(error, "body", None)
+    if isinstance(body, dict) and isinstance(body.get("error"), dict):
+        kind = RETRYABLE_ERROR_TYPES.get(body["error"].get("type"))
+        if kind is not None:
+            return kind
+    return RETRYABLE_STATUS.get(getattr(error, "status_code", None))
+
+def retry_after(error):
+    # Seconds the server asked to wait, from retry-after-ms or retry-after (seconds or an HTTP date)
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is None:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, error=None):
+    after = retry_after(error)
+    if after is not None:
+        return min(max(after, 0.0), RETRY_MAX_WAIT)
+    # Half fixed, half random: the wait still doubles with every attempt, but clients that
+    # failed together spread out instead of retrying in lockstep
+    cap = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+    return cap / 2 + random.uniform(0, cap / 2)
+
+async def with_retries(call, on_retry=None, attempts=RETRY_MAX_ATTEMPTS):
+    """Awaits call() until it succeeds, retrying transient failures with backoff."""
+    for attempt in range(attempts):
+        started = time.perf_counter()
+        try:
+            return await call()
+        except Exception as e:
+            kind = classify(e)
+            if kind is None or attempt + 1 >= attempts:
+                raise
+            delay = backoff_delay(attempt, e)
+            if on_retry is not None:
+                on_retry(kind, attempt + 1, delay, e, started)
+            await asyncio.sleep(delay)
+
+async def start_stream(client, params):
+    # Opens a stream and reads it up to the first token; returns it with the events read so far
+    manager = client.messages.stream(**params)
+    stream = await manager.__aenter__()
+    events = []
+    try:
+        while True:
+            try:
+                event = await stream.__anext__()
+            except StopAsyncIteration:
+                break
+            events.append(event)
+            if event.type in TOKEN_EVENTS:
+                break
+    except BaseException:
+        await manager.__aexit__(None, None, None)
+        raise
+    return manager, stream, events
+
+async def close_stream(task):
+    manager, _, _ = task.result()
+    await manager.__aexit__(None, None, None)
+
+async def open_stream(client, params, hedge_after=HEDGE_AFTER):
+    """Starts a streamed request and returns (manager, stream, events read so far, hedged).
+
+    With hedge_after set, a second copy of the request is sent when the first has not
+    produced a token after that many seconds; the first copy to get there is used and the
+    other one is closed.
+    """
+    if not hedge_after:
+        return (*await start_stream(client, params), False)
+    tasks = [asyncio.ensure_future(start_stream(client, params))]
+    winner = None
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if not done:
+            tasks.append(asyncio.ensure_future(start_stream(client, params)))
+        pending = set(tasks)
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in tasks if task in done and task.exception() is None), None)
+        if winner is None:
+            # Every copy failed; report the original request's error
+            raise tasks[0].exception()
+        return (*winner.result(), len(tasks) > 1)
+    finally:
+        for task in tasks:
+            if task is winner:
+                continue
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled() and task.exception() is None:
+                asyncio.ensure_future(close_stream(task))
+
+def join_prefix(message, prefix):
+    # A resumed response only holds the continuation; the text streamed before the break goes in front
+    if not prefix:
+        return message
+    content = list(message.content)
+    if content and content[0].type == "text":
+        content[0] = content[0].model_copy(update={"text": prefix + content[0].text})
+    else:
+        from anthropic.types import TextBlock
+        content.insert(0, TextBlock(type="text", text=prefix))
+    return message.model_copy(update={"content": content})
+
+async def stream_message(client, params, on_text, on_event=None, on_retry=None, attempts=RETRY_MAX_ATTEMPTS, hedge_after=HEDGE_AFTER):
+    """Streams one model response, retrying transient failures with backoff.
+
+    on_text gets the response text as it arrives and on_event every other stream event.
+    When a stream breaks after some text came through, the retry sends that text back as
+    the start of the assistant message and the model carries on from there, so on_text
+    never gets the same text twice. Returns the final message, with the text from before
+    the break joined in, and a dict with the attempts made, whether the request was hedged,
+    and when the last attempt was sent and produced its first token.
+    """
+    prefix = ""
+    for attempt in range(attempts):
+        started = time.perf_counter()
+        request = params
+        skip = ""
+        if prefix:
+            # The API rejects a prefill that ends in whitespace; the continuation repeats it
+            # and that part has been shown already
+            prefill = prefix.rstrip()
+            skip = prefix[len(prefill):]
+            prefix = prefill
+            request = dict(params, messages=params["messages"] + [{"role": "assistant", "content": prefill}])
+        streamed = ""
+        text_only = True
+        first_token = None
+
+        def handle(event):
+            nonlocal streamed, skip, text_only, first_token
+            if first_token is None and event.type in TOKEN_EVENTS:
+                first_token = time.perf_counter()
+            if event.type == "content_block_start" and event.content_block.type != "text":
+                # Text after a tool call cannot be resumed as a prefill
+                text_only = False
+            if event.type != "text":
+                if on_event is not None:
+                    on_event(event)
+                return
+            text = event.text
+            if text_only:
+                streamed += text
+            if skip:
+                common = len(os.path.commonprefix([skip, text]))
+                text, skip = text[common:], skip[common:] if common == len(text) else ""
+            if text:
+                on_text(text)
+
+        try:
+            manager, stream, events, hedged = await open_stream(client, request, hedge_after)
+            try:
+                for event in events:
+                    handle(event)
+                async for event in stream:
+                    handle(event)
+                message = await stream.get_final_message()
+            finally:
+                await manager.__aexit__(None, None, None)
+            if message.stop_reason is None:
+                raise IncompleteStream("The response stream ended before message_stop")
+        except Exception as e:
+            kind = classify(e)
+            if kind is None or attempt + 1 >= attempts:
+                raise
+            prefix += streamed
+            delay = backoff_delay(attempt, e)
+            if on_retry is not None:
+                on_retry(kind, attempt + 1, delay, e, started)
+            await asyncio.sleep(delay)
+            continue
+        return join_prefix(message, prefix), {
+            "attempts": attempt + 1,
+            "hedged": hedged,
+            "sent": started,
+            "first_token": first_token or time.perf_counter(),
+        }
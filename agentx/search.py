@@ -0,0 +1,226 @@
+# search.py
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from concurrent.futures import Future, ThreadPoolExecutor
+from agentx.config import AGENTX_HOME, MAX_TOOL_WORKERS, SEARXNG_URL, SEARXNG_MAX_RESULTS, SEARCH_CACHE_ENTRIES, SEARCH_CACHE_TTL, SEARCH_TIMEOUT, SEARCH_BACKEND, MULTI_SEARCH_MAX_QUERIES, MULTI_SEARCH_MAX_RESULTS, MULTI_SEARCH_SNIPPET_CHARS
+from agentx.journal import write_atomic
+
+SEARCH_CACHE_DIR = os.path.join(AGENTX_HOME, "search-cache")
+
+_memory_cache = OrderedDict()
+_inflight = {}
+_lock = threading.Lock()
+_clients = {}
+_clients_lock = threading.Lock()
+_pool = ThreadPoolExecutor(max_workers=MULTI_SEARCH_MAX_QUERIES, thread_name_prefix="agentx-search")
+
+def normalize_query(query):
+    # Queries that differ only in case, spacing or trailing punctuation share a cache entry
+    return re.sub(r"\s+", " ", query).strip().rstrip("?!.").strip().lower()
+
+def disk_path(key):
+    return os.path.join(SEARCH_CACHE_DIR, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+def read_cache(key, ttl):
+    now = time.time()
+    with _lock:
+        entry = _memory_cache.get(key)
+        if entry is not None and now - entry[0] < ttl:
+            _memory_cache.move_to_end(key)
+            return entry
+    try:
+        with open(disk_path(key), "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if record.get("key") != key or now - record["time"] >= ttl:
+        return None
+    entry = (record["time"], record["result"])
+    remember(key, entry)
+    return entry
+
+def remember(key, entry):
+    with _lock:
+        _memory_cache[key] = entry
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > SEARCH_CACHE_ENTRIES:
+            _memory_cache.popitem(last=False)
+
+def write_cache(key, result):
+    entry = (time.time(), result)
+    remember(key, entry)
+    try:
+        os.makedirs(SEARCH_CACHE_DIR, exist_ok=True)
+        write_atomic(disk_path(key), json.dumps({"key": key, "time": entry[0], "result": result}))
+    except (OSError, TypeError):
+        pass
+
+def cached_search(backend, query, fetch, ttl=SEARCH_CACHE_TTL):
+    """Return fetch(), cached under (backend, normalized query) in memory and on disk.
+
+    Concurrent calls for the same key share a single fetch; errors are raised to every
+    waiter and are not cached.
+    """
+    key = f"{backend}:{normalize_query(query)}"
+    entry = read_cache(key, ttl)
+    if entry is not None:
+        return entry[1]
+    with _lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        return future.result()
+    try:
+        result = fetch()
+        write_cache(key, result)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+def get_session():
+    # One pooled session for all search requests, sized for the parallel tool workers
+    with _clients_lock:
+        if "session" not in _clients:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_TOOL_WORKERS)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _clients["session"] = session
+        return _clients["session"]
+
+def get_tavily_client():
+    with _clients_lock:
+        if "tavily" not in _clients:
+            from tavily import TavilyClient
+            _clients["tavily"] = TavilyClient(api_key=os.environ.get("TAVILY_API_KEY"))
+        return _clients["tavily"]
+
+def searxng_results(query, url=None):
+    url = url or SEARXNG_URL
+
+    def fetch():
+        response = get_session().get(url, params={"q": query, "format": "json"}, timeout=SEARCH_TIMEOUT)
+        response.raise_for_status()
+        return [
+            {"title": result.get("title", ""), "url": result.get("url", ""), "content": result.get("content", "")}
+            for result in response.json().get("results", [])
+        ]
+
+    return cached_search(f"searxng:{url}", query, fetch)
+
+def searxng_search(query, url=None):
+    try:
+        formatted_results = []
+        for result in searxng_results(query, url)[:SEARXNG_MAX_RESULTS]:
+            formatted_results.append(f"Title: {result['title']}\nURL: {result['url']}\nSnippet: {result['content']}\n")
+        return "\n".join(formatted_results) if formatted_results else "No results found."
+    except Exception as e:
+        return f"Error performing search: {str(e)}"
+
+def tavily_search(query):
+    try:
+        return cached_search("tavily-qna", query, lambda: get_tavily_client().qna_search(query=query, search_depth="advanced"))
+    except Exception as e:
+        return f"Error performing search: {str(e)}"
+
+def tavily_results(query):
+    def fetch():
+        response = get_tavily_client().search(query=query, search_depth="advanced", max_results=10)
+        return [
+            {"title": result.get("title", ""), "url": result.get("url", ""), "content": result.get("content", "")}
+            for result in response.get("results", [])
+        ]
+
+    return cached_search("tavily", query, fetch)
+
+BACKENDS = {"tavily": tavily_results, "searxng": searxng_results}
+
+def normalize_url(url):
+    # The same page reached through different links: scheme, www., trailing slash,
+    # fragment and utm_* tracking parameters do not count
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not k.startswith("utm_")])
+    return urlunsplit(("", host, parts.path.rstrip("/"), query, ""))
+
+def merge_results(result_lists):
+    """Merge ranked result lists, deduplicated by URL.
+
+    Results found by more queries come first; ties go to the best position in any list.
+    """
+    merged = {}
+    for query_index, results in enumerate(result_lists):
+        for position, result in enumerate(results):
+            if not result.get("url"):
+                continue
+            key = normalize_url(result["url"])
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = entry = {"result": result, "queries": set(), "best": position}
+            entry["queries"].add(query_index)
+            entry["best"] = min(entry["best"], position)
+            # Keep the longest snippet among the duplicates
+            if len(result.get("content", "")) > len(entry["result"].get("content", "")):
+                entry["result"] = dict(entry["result"], content=result["content"])
+    return sorted(merged.values(), key=lambda entry: (-len(entry["queries"]), entry["best"]))
+
+def multi_search(queries, backend=None, max_results=MULTI_SEARCH_MAX_RESULTS):
+    try:
+        backend = backend or SEARCH_BACKEND
+        if backend not in BACKENDS:
+            return f"Error performing search: unknown backend {backend!r}, use one of {', '.join(BACKENDS)}"
+        # Queries that normalize to the same text are only run once
+        unique = []
+        seen = set()
+        for query in queries:
+            normalized = normalize_query(query)
+            if normalized and normalized not in seen:
+                seen.add(normalized)
+                unique.append(query)
+        unique = unique[:MULTI_SEARCH_MAX_QUERIES]
+        max_results = max(1, min(int(max_results), MULTI_SEARCH_MAX_RESULTS))
+
+        futures = [_pool.submit(BACKENDS[backend], query) for query in unique]
+        result_lists = []
+        failures = []
+        for query, future in zip(unique, futures):
+            try:
+                result_lists.append(future.result())
+            except Exception as e:
+                result_lists.append([])
+                failures.append(f"Query {query!r} failed: {str(e)}")
+        merged = merge_results(result_lists)
+    except Exception as e:
+        return f"Error performing search: {str(e)}"
+
+    total = sum(len(results) for results in result_lists)
+    lines = [f"[{backend} search, {len(unique)} queries: {total} results, {len(merged)} unique URLs; showing {min(max_results, len(merged))}]"]
+    for rank, entry in enumerate(merged[:max_results], 1):
+        result = entry["result"]
+        snippet = " ".join(result.get("content", "").split())
+        if len(snippet) > MULTI_SEARCH_SNIPPET_CHARS:
+            snippet = snippet[:MULTI_SEARCH_SNIPPET_CHARS].rsplit(" ", 1)[0] + "..."
+        lines.append(f"{rank}. {result.get('title', '')} ({len(entry['queries'])}/{len(unique)} queries)")
+        lines.append(f"   {result['url']}")
+        if snippet:
+            lines.append(f"   {snippet}")
+    lines.extend(failures)
+    return "\n".join(lines)
@@ -0,0 +1,330 @@
+# server.py
+#
+# Local HTTP API for running many sessions in one process (agentx serve):
+#
+#   GET    /health                     server status
+#   GET    /sessions                   sessions held by the server
+#   POST   /sessions                   {"cwd": ..., "resume": SESSION_ID}, both optional
+#   GET    /sessions/ID                one session
+#   DELETE /sessions/ID                cancel its turn and drop it from the server (it stays saved)
+#   POST   /sessions/ID/messages       {"message": ..., "image_path": ..., "automode": N}
+#   POST   /sessions/ID/cancel         cancel the running turn
+#
+# A message runs one turn (or an automode run of up to N iterations) and answers with a
+# stream of server-sent events: "text" deltas as the model writes, "tool_use" and
+# "tool_result" as tools run, "retry" and "iteration" when they happen, and a final "done"
+# with the outcome. All sessions share the engine's client and connection pool and the
+# search, image and index caches.
+
+import os
+import re
+import hmac
+import json
+import time
+import signal
+import asyncio
+from urllib.parse import urlsplit
+from agentx.store import SessionStore
+from agentx.session import Session
+from agentx.config import SERVE_HOST, SERVE_PORT, SERVE_TOKEN, SERVE_MAX_BODY, SERVE_KEEPALIVE
+
+SESSION_ID = re.compile(r"^[A-Za-z0-9._-]+$")
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 415: "Unsupported Media Type",
+           500: "Internal Server Error"}
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "[::1]")
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class EventRenderer:
+    """Stands in for StreamRenderer and passes text deltas on as events instead of drawing them."""
+
+    def __init__(self, emit):
+        self.emit = emit
+
+    def feed(self, text):
+        self.emit("text", {"text": text})
+
+    def tick(self):
+        pass
+
+    def close(self):
+        pass
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode("utf-8")
+
+async def read_request(reader):
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    if not request_line:
+        return None
+    try:
+        method, target, _ = request_line.split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1")
+        if line in ("\r\n", "\n", ""):
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+        if len(headers) > 100:
+            raise HTTPError(400, "Too many headers")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPError(400, "Bad Content-Length")
+    if length > SERVE_MAX_BODY:
+        raise HTTPError(413, f"Request bodies are limited to {SERVE_MAX_BODY} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), urlsplit(target).path, headers, body
+
+def json_body(body):
+    if not body:
+        return {}
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise HTTPError(400, "The request body is not valid JSON")
+    if not isinstance(data, dict):
+        raise HTTPError(400, "The request body must be a JSON object")
+    return data
+
+class Server:
+    """Holds the sessions of one agentx serve process and answers their HTTP requests."""
+
+    def __init__(self, token=SERVE_TOKEN, host=SERVE_HOST, port=SERVE_PORT):
+        self.token = token
+        self.hosts = set()
+        self.listen_on(host, port)
+        self.sessions = {}
+        self.running = {}
+        self.connections = set()
+        self.started = time.time()
+        # What a session would print on a terminal has nowhere to go; clients get events instead
+        self.out = open(os.devnull, "w")
+
+    def listen_on(self, host, port):
+        # Host headers the server answers to; anything else may be a DNS rebinding attempt
+        names = set(LOOPBACK_HOSTS)
+        if host not in ("", "0.0.0.0", "::", "127.0.0.1", "::1", "localhost"):
+            names.add(f"[{host}]" if ":" in host else host)
+        self.hosts = {f"{name}:{port}" for name in names}
+
+    def check_request(self, method, headers):
+        # The API drives an agent that writes files, so requests a web page could send are refused:
+        # browsers add Origin to cross-origin requests, rebinding shows in Host, and a JSON
+        # content type cannot be sent cross-origin without a preflight the server never answers
+        if "origin" in headers:
+            raise HTTPError(403, "Requests from web pages are not accepted")
+        if headers.get("host", "").lower() not in self.hosts:
+            raise HTTPError(403, f"Unexpected Host header {headers.get('host')!r}")
+        if self.token and not hmac.compare_digest(headers.get("authorization", ""), f"Bearer {self.token}"):
+            raise HTTPError(401, "Missing or wrong bearer token")
+        if method == "POST" and headers.get("content-type", "").split(";")[0].strip().lower() != "application/json":
+            raise HTTPError(415, "POST bodies must be sent as Content-Type: application/json")
+
+    def info(self, session):
+        return {
+            "id": session.session_id,
+            "cwd": session.workspace,
+            "messages": len(session.conversation_history),
+            "running": session.session_id in self.running,
+            "automode": session.automode,
+        }
+
+    def get_session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise HTTPError(404, f"No session {session_id}")
+        return session
+
+    def create_session(self, data):
+        resume = data.get("resume")
+        if resume is not None:
+            if not isinstance(resume, str) or not SESSION_ID.match(resume):
+                raise HTTPError(400, "\"resume\" must be a session id")
+            if resume in self.sessions:
+                return self.sessions[resume]
+            store = SessionStore(resume)
+            if not store.exists():
+                raise HTTPError(404, f"No saved session {resume}")
+        else:
+            store = SessionStore()
+        cwd = data.get("cwd") or (store.read_meta().get("cwd") if resume else os.getcwd())
+        if cwd is None:
+            # Sessions saved before their folder was recorded; the server's own is a guess
+            raise HTTPError(400, f"Session {resume} does not record its folder; pass \"cwd\"")
+        if not isinstance(cwd, str) or not os.path.isdir(cwd):
+            raise HTTPError(400, f"No such folder: {cwd}")
+        session = Session(store, workspace=cwd, out=self.out)
+        self.sessions[session.session_id] = session
+        return session
+
+    def cancel(self, session_id):
+        task = self.running.get(session_id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    async def handle(self, reader, writer):
+        connection = asyncio.current_task()
+        self.connections.add(connection)
+        try:
+            try:
+                request = await read_request(reader)
+                if request is None:
+                    return
+                method, path, headers, body = request
+                self.check_request(method, headers)
+                await self.route(method, path, body, writer)
+            except HTTPError as e:
+                await self.respond(writer, e.status, {"error": str(e)})
+            except asyncio.IncompleteReadError:
+                return
+            except Exception as e:
+                await self.respond(writer, 500, {"error": f"Error handling request: {str(e)}"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            self.connections.discard(connection)
+
+    async def route(self, method, path, body, writer):
+        parts = [part for part in path.split("/") if part]
+        if parts == ["health"] and method == "GET":
+            return await self.respond(writer, 200, {"status": "ok", "sessions": len(self.sessions), "running": len(self.running), "uptime": round(time.time() - self.started, 1)})
+        if parts == ["sessions"]:
+            if method == "GET":
+                return await self.respond(writer, 200, {"sessions": [self.info(session) for session in self.sessions.values()]})
+            if method == "POST":
+                return await self.respond(writer, 201, self.info(self.create_session(json_body(body))))
+        elif len(parts) >= 2 and parts[0] == "sessions":
+            session = self.get_session(parts[1])
+            if len(parts) == 2 and method == "GET":
+                return await self.respond(writer, 200, self.info(session))
+            if len(parts) == 2 and method == "DELETE":
+                self.cancel(session.session_id)
+                del self.sessions[session.session_id]
+                return await self.respond(writer, 200, {"id": session.session_id, "deleted": True})
+            if parts[2:] == ["cancel"] and method == "POST":
+                return await self.respond(writer, 200, {"id": session.session_id, "cancelled": self.cancel(session.session_id)})
+            if parts[2:] == ["messages"] and method == "POST":
+                return await self.stream_turn(session, json_body(body), writer)
+        if parts in (["health"], ["sessions"]) or (len(parts) in (2, 3) and parts[0] == "sessions" and parts[2:] in ([], ["cancel"], ["messages"])):
+            raise HTTPError(405, f"{method} is not supported on {path}")
+        raise HTTPError(404, f"Nothing at {path}")
+
+    async def respond(self, writer, status, data):
+        body = json.dumps(data, default=str).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    async def stream_turn(self, session, data, writer):
+        """Runs a turn of the session and streams its events. A client that goes away does not
+        stop the turn; it finishes and its outcome is in the session's history."""
+        message = data.get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise HTTPError(400, "A message needs a non-empty \"message\"")
+        automode = data.get("automode")
+        if automode is not None and (not isinstance(automode, int) or isinstance(automode, bool) or automode < 1):
+            raise HTTPError(400, "\"automode\" must be a positive number of iterations")
+        image_path = data.get("image_path")
+        if image_path is not None and (automode is not None or not isinstance(image_path, str) or not os.path.isfile(image_path)):
+            raise HTTPError(400, "\"image_path\" must be an existing file, and cannot be combined with automode")
+        if session.session_id in self.running:
+            raise HTTPError(409, f"Session {session.session_id} is already running a turn")
+
+        events = asyncio.Queue()
+
+        def emit(event, payload):
+            events.put_nowait((event, payload))
+
+        async def turn():
+            renderer = EventRenderer(emit)
+            if automode is not None:
+                status, iterations = await session.arun_automode(message, automode, renderer, emit)
+                return {"status": status, "iterations": iterations}
+            response, exit_continuation = await session.achat(message, image_path, renderer=renderer, listener=emit)
+            # Only a failed turn returns text, the error message
+            if response:
+                return {"status": "error", "error": response}
+            return {"status": "ok", "exit_continuation": exit_continuation}
+
+        task = asyncio.ensure_future(turn())
+        self.running[session.session_id] = task
+        task.add_done_callback(lambda _: self.running.pop(session.session_id, None))
+        task.add_done_callback(lambda _: events.put_nowait(None))
+
+        connected = True
+
+        async def send(chunk):
+            nonlocal connected
+            if not connected:
+                return
+            try:
+                writer.write(chunk)
+                await writer.drain()
+            except ConnectionError:
+                connected = False
+
+        await send(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        await send(sse("start", {"id": session.session_id}))
+        while True:
+            try:
+                item = await asyncio.wait_for(events.get(), SERVE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                await send(b": keep-alive\n\n")
+                continue
+            if item is None:
+                break
+            await send(sse(*item))
+
+        if task.cancelled():
+            outcome = {"status": "cancelled"}
+        elif task.exception() is not None:
+            outcome = {"status": "failed", "error": str(task.exception())}
+        else:
+            outcome = task.result()
+        await send(sse("done", {**outcome, "messages": len(session.conversation_history)}))
+
+async def serve(host=SERVE_HOST, port=SERVE_PORT, token=SERVE_TOKEN, on_ready=None):
+    """Serves the API until Ctrl+C (or until cancelled), then cancels the turns still running."""
+    server = Server(token, host, port)
+    listener = await asyncio.start_server(server.handle, host, port)
+    # With port 0 the system picks one
+    server.listen_on(host, listener.sockets[0].getsockname()[1])
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    try:
+        # Stop from the loop, so the interrupt does not land inside whichever request is being handled
+        loop.add_signal_handler(signal.SIGINT, stopped.set)
+    except (NotImplementedError, RuntimeError):
+        pass
+    if on_ready is not None:
+        on_ready(listener.sockets[0].getsockname())
+    try:
+        async with listener:
+            try:
+                await stopped.wait()
+            finally:
+                # Before the listener closes, which waits for open connections (and so for their turns);
+                # the clients of cancelled turns still get their "done" event
+                tasks = list(server.running.values())
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                if server.connections:
+                    await asyncio.wait(list(server.connections), timeout=5)
+    finally:
+        try:
+            loop.remove_signal_handler(signal.SIGINT)
+        except (NotImplementedError, RuntimeError):
+            pass
+        server.out.close()
@@ -0,0 +1,88 @@
+# session.py
+
+import os
+from contextlib import contextmanager
+from agentx.utils import print_colored, current_output
+from agentx.executor import current_workspace
+from agentx.conversation import process_and_display_response
+from agentx.config import TOOL_COLOR, CONTINUATION_EXIT_PHRASE, MAX_CONTINUATION_ITERATIONS
+
+class Session:
+    """One conversation with the agent: its history, automode state and saved session.
+
+    The CLI prompt drives a single session; batch mode runs many of them side by side on
+    one event loop. A session with a workspace resolves its tools' relative paths there
+    instead of in the current directory, and one with an out file writes everything its
+    turns print there instead of to stdout. Without a store nothing is saved to disk.
+    """
+
+    def __init__(self, store=None, workspace=None, out=None):
+        self.store = store
+        self.workspace = os.path.abspath(workspace) if workspace else None
+        self.out = out
+        self.automode = False
+        self.conversation_history = store.load() if store is not None and store.exists() else []
+
+    @property
+    def session_id(self):
+        return self.store.session_id if self.store is not None else None
+
+    @contextmanager
+    def bound(self):
+        # Set in the task running this session, so concurrent sessions do not see each other's
+        workspace_token = current_workspace.set(self.workspace)
+        output_token = current_output.set(self.out)
+        try:
+            yield
+        finally:
+            current_output.reset(output_token)
+            current_workspace.reset(workspace_token)
+
+    async def achat(self, user_input, image_path=None, current_iteration=None, max_iterations=None, renderer=None, listener=None):
+        """Runs one turn and shows its outcome; returns (response, exit_continuation) like achat_with_claude."""
+        from agentx.engine import achat_with_claude
+        from agentx.render import StreamRenderer
+        with self.bound():
+            if renderer is None:
+                renderer = StreamRenderer(out=self.out)
+            response, exit_continuation = await achat_with_claude(user_input, image_path, self.conversation_history, self.automode, current_iteration, max_iterations, renderer=renderer, store=self.store, listener=listener)
+            process_and_display_response(response)
+            return response, exit_continuation
+
+    async def arun_automode(self, user_input, max_iterations=MAX_CONTINUATION_ITERATIONS, renderer=None, listener=None):
+        """Works on user_input until the model says it is done, the iterations run out or a turn fails.
+
+        Returns the outcome ("completed", "max_iterations" or "error") and the number of iterations run.
+        """
+        self.automode = True
+        try:
+            with self.bound():
+                return await self.automode_loop(user_input, max_iterations, renderer, listener)
+        finally:
+            self.automode = False
+
+    async def automode_loop(self, user_input, max_iterations, renderer, listener):
+        for iteration in range(1, max_iterations + 1):
+            if listener is not None:
+                listener("iteration", {"iteration": iteration, "max_iterations": max_iterations})
+            response, exit_continuation = await self.achat(user_input, None, iteration, max_iterations, renderer, listener)
+            if exit_continuation or CONTINUATION_EXIT_PHRASE in response:
+                print_colored("Automode completed.", TOOL_COLOR)
+                return "completed", iteration
+            if response:
+                # Only a failed turn returns text (the error message); more iterations would fail the same way
+                print_colored("Automode stopped after an error.", TOOL_COLOR)
+                return "error", iteration
+            print_colored(f"Continuation iteration {iteration} completed.", TOOL_COLOR)
+            user_input = "Continue with the next step."
+        print_colored("Max iterations reached. Exiting automode.", TOOL_COLOR)
+        return "max_iterations", max_iterations
+
+    def chat(self, user_input, image_path=None):
+        # Synchronous entry points for the CLI; Ctrl+C cancels the running turn and propagates
+        from agentx.engine import run_turn
+        return run_turn(self.achat(user_input, image_path))
+
+    def run_automode(self, user_input, max_iterations=MAX_CONTINUATION_ITERATIONS):
+        from agentx.engine import run_turn
+        return run_turn(self.arun_automode(user_input, max_iterations))
@@ -9,7 +9,8 @@ setup(
         'pygments',
         'tavily',
         'anthropic',
-        'Pillow'
+        'Pillow',
+        'requests'
     ],
     entry_points={
         'console_scripts': [
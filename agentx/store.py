@@ -0,0 +1,161 @@
+# store.py
+
+import os
+import json
+import gzip
+import time
+import uuid
+import base64
+import hashlib
+from agentx.config import AGENTX_HOME
+from agentx.context import block_field
+from agentx.executor import workspace_root
+
+SESSION_DIR = os.path.join(AGENTX_HOME, "sessions")
+BLOB_DIR = os.path.join(AGENTX_HOME, "blobs")
+
+def new_session_id():
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def put_blob(data):
+    # Images are kept once per content hash, as compressed raw bytes rather than base64 text
+    raw = base64.b64decode(data)
+    digest = hashlib.sha256(raw).hexdigest()
+    path = os.path.join(BLOB_DIR, f"{digest}.gz")
+    if not os.path.exists(path):
+        os.makedirs(BLOB_DIR, exist_ok=True)
+        write_atomic(path, gzip.compress(raw, compresslevel=6))
+    return digest
+
+def get_blob(digest):
+    with open(os.path.join(BLOB_DIR, f"{digest}.gz"), "rb") as f:
+        return base64.b64encode(gzip.decompress(f.read())).decode("utf-8")
+
+def block_to_record(block):
+    kind = block_field(block, "type")
+    if kind == "text":
+        return {"type": "text", "text": block_field(block, "text")}
+    if kind == "tool_use":
+        return {"type": "tool_use", "id": block_field(block, "id"), "name": block_field(block, "name"), "input": block_field(block, "input")}
+    if kind == "image":
+        source = block_field(block, "source")
+        if source.get("type") == "base64" and "data" in source:
+            return {"type": "image", "source": {"type": "base64", "media_type": source["media_type"], "blob": put_blob(source["data"])}}
+        return {"type": "image", "source": source}
+    if isinstance(block, dict):
+        return block
+    return block.model_dump()
+
+def block_from_record(record):
+    if record.get("type") == "image" and "blob" in record.get("source", {}):
+        source = record["source"]
+        return {"type": "image", "source": {"type": "base64", "media_type": source["media_type"], "data": get_blob(source["blob"])}}
+    return record
+
+def message_to_record(message):
+    content = message.get("content")
+    if not isinstance(content, str):
+        content = [block_to_record(block) for block in content or []]
+    return {"role": message["role"], "content": content}
+
+def message_from_record(record):
+    content = record["content"]
+    if not isinstance(content, str):
+        content = [block_from_record(block) for block in content]
+    return {"role": record["role"], "content": content}
+
+class SessionStore:
+    """Append-only JSONL log of one session.
+
+    New messages are appended as they happen. When the history is rewritten (context compaction),
+    a checkpoint with the full history is appended and its offset saved in the meta file, so
+    resuming only reads from the last checkpoint onwards.
+    """
+
+    def __init__(self, session_id=None, root=SESSION_DIR):
+        self.session_id = session_id or new_session_id()
+        self.root = root
+        self.log_path = os.path.join(root, f"{self.session_id}.jsonl")
+        self.meta_path = os.path.join(root, f"{self.session_id}.meta.json")
+        self.synced = 0
+
+    def exists(self):
+        return os.path.exists(self.log_path)
+
+    def write_records(self, records):
+        os.makedirs(self.root, exist_ok=True)
+        data = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+        with open(self.log_path, "ab") as f:
+            offset = f.tell()
+            f.write(data.encode("utf-8"))
+        return offset
+
+    def read_meta(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"checkpoint_offset": 0}
+
+    def write_meta(self, meta):
+        os.makedirs(self.root, exist_ok=True)
+        write_atomic(self.meta_path, json.dumps(meta).encode("utf-8"))
+
+    def sync(self, conversation_history):
+        # Append whatever was added to the history since the last call
+        new_messages = conversation_history[self.synced:]
+        if new_messages and not os.path.exists(self.meta_path):
+            # Written with the first messages, so a resumed session knows the folder it worked in
+            self.write_meta({"session_id": self.session_id, "checkpoint_offset": 0, "cwd": workspace_root()})
+        if new_messages:
+            self.write_records([{"op": "append", "message": message_to_record(message)} for message in new_messages])
+        self.synced = len(conversation_history)
+
+    def checkpoint(self, conversation_history):
+        offset = self.write_records([{
+            "op": "checkpoint",
+            "messages": [message_to_record(message) for message in conversation_history]
+        }])
+        meta = self.read_meta()
+        meta.update({"session_id": self.session_id, "checkpoint_offset": offset, "cwd": workspace_root()})
+        self.write_meta(meta)
+        self.synced = len(conversation_history)
+
+    def load(self):
+        conversation_history = []
+        offset = self.read_meta().get("checkpoint_offset", 0)
+        with open(self.log_path, "rb+") as f:
+            f.seek(offset)
+            while True:
+                line_offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write; cut it off so new records start clean
+                    f.truncate(line_offset)
+                    break
+                if record["op"] == "checkpoint":
+                    conversation_history = [message_from_record(message) for message in record["messages"]]
+                elif record["op"] == "append":
+                    conversation_history.append(message_from_record(record["message"]))
+        self.synced = len(conversation_history)
+        return conversation_history
+
+def list_sessions(root=SESSION_DIR):
+    if not os.path.isdir(root):
+        return []
+    sessions = []
+    for name in os.listdir(root):
+        if name.endswith(".jsonl"):
+            path = os.path.join(root, name)
+            sessions.append((os.path.getmtime(path), name[:-len(".jsonl")]))
+    return [session_id for _, session_id in sorted(sessions, reverse=True)]
@@ -0,0 +1,185 @@
+# symbols.py
+
+import os
+import ast
+import pickle
+import hashlib
+import threading
+from agentx.config import AGENTX_HOME, INDEX_MAX_FILE_BYTES, SYMBOL_MAX_RESULTS, SYMBOL_MAX_SOURCE_LINES
+from agentx.journal import write_atomic
+from agentx.listing import iter_files
+from agentx.codeindex import workspace_scope, in_scope
+
+SYMBOL_DIR = os.path.join(AGENTX_HOME, "symbols")
+SYMBOL_VERSION = 1
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+def collect_symbols(source):
+    """Return (definitions, references) of a Python module.
+
+    definitions: (qualified name, kind, first line, last line), the span including decorators
+    references: name -> line numbers where it is used, imported or accessed as an attribute
+    """
+    tree = ast.parse(source)
+    definitions = []
+    references = {}
+
+    def visit(node, scope):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                qualname = f"{scope}.{child.name}" if scope else child.name
+                if isinstance(child, ast.ClassDef):
+                    kind = "class"
+                else:
+                    kind = "method" if scope and isinstance(node, ast.ClassDef) else "function"
+                start = min([child.lineno] + [decorator.lineno for decorator in child.decorator_list])
+                definitions.append((qualname, kind, start, child.end_lineno))
+                visit(child, qualname)
+                continue
+            if isinstance(child, ast.Name):
+                references.setdefault(child.id, []).append(child.lineno)
+            elif isinstance(child, ast.Attribute):
+                references.setdefault(child.attr, []).append(child.lineno)
+            elif isinstance(child, ast.alias):
+                references.setdefault(child.name.rsplit(".", 1)[-1], []).append(child.lineno)
+                if child.asname:
+                    references.setdefault(child.asname, []).append(child.lineno)
+            visit(child, scope)
+
+    visit(tree, "")
+    return definitions, references
+
+class SymbolTable:
+    """Definitions and references of the Python files under a workspace root.
+
+    Parsed results are cached by content hash and saved under AGENTX_HOME/symbols; refresh()
+    only hashes files whose mtime or size changed and only parses contents not seen before.
+    """
+
+    def __init__(self, root, symbol_dir=SYMBOL_DIR):
+        self.root = os.path.abspath(root)
+        digest = hashlib.sha256(self.root.encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(symbol_dir, f"{digest}.pickle")
+        self.files = {}
+        self.by_hash = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                saved = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            return
+        if saved.get("version") == SYMBOL_VERSION and saved.get("root") == self.root:
+            self.files = saved["files"]
+            self.by_hash = saved["by_hash"]
+
+    def save(self):
+        # Drop parse results no file points to any more
+        live = {entry[2] for entry in self.files.values()}
+        self.by_hash = {digest: symbols for digest, symbols in self.by_hash.items() if digest in live}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        write_atomic(self.path, pickle.dumps({"version": SYMBOL_VERSION, "root": self.root, "files": self.files, "by_hash": self.by_hash}, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def index_file(self, full_path, relative, stat):
+        with open(full_path, "rb") as f:
+            source = f.read()
+        digest = hashlib.sha256(source).hexdigest()
+        if digest not in self.by_hash:
+            try:
+                self.by_hash[digest] = collect_symbols(source)
+            except (SyntaxError, ValueError, RecursionError):
+                # Files that do not parse (yet) have no symbols until they are fixed
+                self.by_hash[digest] = ([], {})
+        self.files[relative] = (stat.st_mtime_ns, stat.st_size, digest)
+
+    def refresh(self):
+        seen = set()
+        changed = 0
+        for full_path, relative in iter_files(self.root):
+            if not relative.endswith((".py", ".pyi")):
+                continue
+            try:
+                stat = os.stat(full_path)
+                if stat.st_size > INDEX_MAX_FILE_BYTES:
+                    continue
+                seen.add(relative)
+                entry = self.files.get(relative)
+                if entry is None or entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+                    self.index_file(full_path, relative, stat)
+                    changed += 1
+            except OSError:
+                continue
+        for relative in [relative for relative in self.files if relative not in seen]:
+            del self.files[relative]
+            changed += 1
+        if changed:
+            self.save()
+        return changed
+
+    def symbols(self, relative):
+        return self.by_hash[self.files[relative][2]]
+
+def get_table(root):
+    root = os.path.abspath(root)
+    with _tables_lock:
+        if root not in _tables:
+            _tables[root] = SymbolTable(root)
+        return _tables[root]
+
+def name_matches(qualname, name):
+    # "method" matches Class.method; "Class.method" must match the end of the qualified name
+    return qualname == name or qualname.endswith("." + name)
+
+def read_lines(root, relative):
+    with open(os.path.join(root, relative), "r", encoding="utf-8", errors="replace") as f:
+        return f.read().splitlines()
+
+def find_symbol(name, path=".", kind=None, references=False, include_source=True):
+    try:
+        root, prefix = workspace_scope(path)
+        table = get_table(root)
+        with table.lock:
+            table.refresh()
+            files = sorted(relative for relative in table.files if in_scope(relative, prefix, None))
+            found = []
+            used = []
+            for relative in files:
+                definitions, names = table.symbols(relative)
+                for qualname, symbol_kind, start, end in definitions:
+                    if name_matches(qualname, name) and (kind is None or symbol_kind == kind):
+                        found.append((relative, qualname, symbol_kind, start, end))
+                if references:
+                    for line in sorted(set(names.get(name.rsplit(".", 1)[-1], []))):
+                        used.append((relative, line))
+
+        output = []
+        for relative, qualname, symbol_kind, start, end in found[:SYMBOL_MAX_RESULTS]:
+            output.append(f"{relative}:{start}-{end} {symbol_kind} {qualname}")
+            if include_source:
+                lines = read_lines(root, relative)[start - 1:end]
+                if len(lines) > SYMBOL_MAX_SOURCE_LINES:
+                    lines = lines[:SYMBOL_MAX_SOURCE_LINES] + [f"... {end - start + 1 - SYMBOL_MAX_SOURCE_LINES} more lines, continue with read_file offset={start + SYMBOL_MAX_SOURCE_LINES}"]
+                output.append("\n".join(lines))
+                output.append("")
+
+        if references:
+            output.append(f"References ({len(used)}):")
+            current_file = None
+            lines = []
+            for relative, line in used[:SYMBOL_MAX_RESULTS]:
+                if relative != current_file:
+                    current_file = relative
+                    lines = read_lines(root, relative)
+                text = lines[line - 1].strip() if line <= len(lines) else ""
+                output.append(f"{relative}:{line}: {text}")
+    except Exception as e:
+        return f"Error finding symbol: {str(e)}"
+
+    header = f"[find_symbol {name!r}: {len(found)} definitions in {len(files)} Python files"
+    if len(found) > SYMBOL_MAX_RESULTS or (references and len(used) > SYMBOL_MAX_RESULTS):
+        header += f"; showing the first {SYMBOL_MAX_RESULTS}, narrow it down with path, kind or Class.method"
+    return header + "]\n" + "\n".join(output).rstrip("\n")
@@ -1,6 +1,10 @@
 # tools.py
 
-from agentx.utils import create_folder, create_file, write_to_file, read_file, list_files, tavily_search
+import asyncio
+from agentx.utils import create_folder, create_file, write_to_file, edit_file, read_file, list_files, search_code, find_symbol, tavily_search, multi_search
+from agentx.config import READ_FILE_DEFAULT_LINES, MULTI_SEARCH_MAX_RESULTS
+from agentx.cassette import run_tool
+from agentx.executor import in_workspace
 
 tools = [
     {
@@ -37,7 +41,7 @@ tools = [
     },
     {
         "name": "write_to_file",
-        "description": "Write content to a file at the specified path. If the file exists, only the necessary changes will be applied. If the file doesn't exist, it will be created. Always provide the full intended content of the file.",
+        "description": "Write content to a file at the specified path. If the file exists, only the necessary changes will be applied. If the file doesn't exist, it will be created. Always provide the full intended content of the file. For changes to part of an existing file, use edit_file instead.",
         "input_schema": {
             "type": "object",
             "properties": {
@@ -48,20 +52,72 @@ tools = [
                 "content": {
                     "type": "string",
                     "description": "The full content to write to the file"
+                },
+                "show_diff": {
+                    "type": "boolean",
+                    "description": "Return the full unified diff instead of just a summary of the change (default: false)"
                 }
             },
             "required": ["path", "content"]
         }
     },
+    {
+        "name": "edit_file",
+        "description": "Make targeted changes to an existing file without resending all of it. Each edit replaces old_text, which must appear exactly once in the file, with new_text; include enough surrounding lines to make old_text unique. Alternatively pass a unified diff. All edits are checked first and written together in one go; if any edit fails, nothing is written and the result says which ones failed.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "path": {
+                    "type": "string",
+                    "description": "The path of the file to edit"
+                },
+                "edits": {
+                    "type": "array",
+                    "description": "Search/replace edits to apply",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "old_text": {
+                                "type": "string",
+                                "description": "The exact text to replace, including whitespace"
+                            },
+                            "new_text": {
+                                "type": "string",
+                                "description": "The text to put in its place"
+                            }
+                        },
+                        "required": ["old_text", "new_text"]
+                    }
+                },
+                "diff": {
+                    "type": "string",
+                    "description": "A unified diff to apply instead of (or in addition to) edits"
+                },
+                "show_diff": {
+                    "type": "boolean",
+                    "description": "Return the full unified diff instead of just a summary of the change (default: false)"
+                }
+            },
+            "required": ["path"]
+        }
+    },
     {
         "name": "read_file",
-        "description": "Read the contents of a file at the specified path. Use this when you need to examine the contents of an existing file.",
+        "description": "Read the contents of a file at the specified path. Use this when you need to examine the contents of an existing file. The result starts with a header giving the total number of lines and the file size; large files are returned a page at a time, and the header tells you which offset to continue from. Binary files are detected and not returned.",
         "input_schema": {
             "type": "object",
             "properties": {
                 "path": {
                     "type": "string",
                     "description": "The path of the file to read"
+                },
+                "offset": {
+                    "type": "integer",
+                    "description": "The 1-based line number to start reading from (default: 1)"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "The maximum number of lines to return (default: 2000)"
                 }
             },
             "required": ["path"]
@@ -69,17 +125,90 @@ tools = [
     },
     {
         "name": "list_files",
-        "description": "List all files and directories in the root folder where the script is running. Use this when you need to see the contents of the current directory.",
+        "description": "List files and directories, optionally recursively, starting at the folder where the script is running. Use this when you need to see the contents or layout of a directory. Entries matched by .gitignore and folders like .git or node_modules are not descended into; folders beyond the requested depth are shown with their number of entries. Use depth to see a whole project layout in one call, and pattern to find files by name.",
         "input_schema": {
             "type": "object",
             "properties": {
                 "path": {
                     "type": "string",
                     "description": "The path of the folder to list (default: current directory)"
+                },
+                "depth": {
+                    "type": "integer",
+                    "description": "How many levels of folders to descend (default: 1, just the folder itself; the whole tree when pattern is given)"
+                },
+                "pattern": {
+                    "type": "string",
+                    "description": "Glob such as '*.py' or 'src/**/*.ts'; when given, returns a flat list of matching file paths"
                 }
             }
         }
     },
+    {
+        "name": "search_code",
+        "description": "Search the contents of the files in the project for a literal string or a regular expression and get back file:line matches with optional context lines. Backed by an index that is kept up to date automatically, so it is fast even on large projects. Use this to find where something is defined or used instead of reading files one by one; then read just the relevant lines with read_file offset and limit. Ignored files (.gitignore, .git, node_modules, ...) are not searched, and regexes match one line at a time.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "The text to search for, or a Python regular expression when regex is true"
+                },
+                "path": {
+                    "type": "string",
+                    "description": "Folder or file to search in (default: current directory)"
+                },
+                "regex": {
+                    "type": "boolean",
+                    "description": "Treat query as a regular expression (default: false)"
+                },
+                "case_sensitive": {
+                    "type": "boolean",
+                    "description": "Match case exactly (default: only if the query contains capital letters)"
+                },
+                "include": {
+                    "type": "string",
+                    "description": "Only search files matching this glob, such as '*.py' or 'src/**/*.ts'"
+                },
+                "context": {
+                    "type": "integer",
+                    "description": "Lines of context to show around each match (default: 0, at most 5)"
+                }
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "find_symbol",
+        "description": "Find the definition of a Python function, class or method by name and get back its file, line span and source, plus optionally every place the name is used. Use this instead of reading whole files when you need to look at or change a specific function or class; edit it with edit_file, or read around it with read_file offset and limit.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "name": {
+                    "type": "string",
+                    "description": "The symbol name, such as 'parse_args', 'Widget' or 'Widget.render'"
+                },
+                "path": {
+                    "type": "string",
+                    "description": "Folder or file to look in (default: current directory)"
+                },
+                "kind": {
+                    "type": "string",
+                    "enum": ["function", "class", "method"],
+                    "description": "Only return definitions of this kind"
+                },
+                "references": {
+                    "type": "boolean",
+                    "description": "Also list the lines where the name is used or imported (default: false)"
+                },
+                "include_source": {
+                    "type": "boolean",
+                    "description": "Include the source of each definition (default: true)"
+                }
+            },
+            "required": ["name"]
+        }
+    },
     {
         "name": "tavily_search",
         "description": "Perform a web search using Tavily API to get up-to-date information or additional context. Use this when you need current information or feel a search could provide a better answer.",
@@ -93,21 +222,55 @@ tools = [
             },
             "required": ["query"]
         }
+    },
+    {
+        "name": "multi_search",
+        "description": "Run several web searches at once and get back one merged list of results, with duplicate pages removed and pages found by more of the queries ranked first. Use this instead of several separate searches when a question needs more than one query, e.g. different phrasings or different aspects of the same topic.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "queries": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "The search queries to run (at most 8)"
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "How many merged results to return (default and maximum: 10)"
+                }
+            },
+            "required": ["queries"]
+        }
     }
 ]
 
 def execute_tool(tool_name, tool_input):
+    tool_input = in_workspace(tool_name, tool_input)
     if tool_name == "create_folder":
         return create_folder(tool_input["path"])
     elif tool_name == "create_file":
         return create_file(tool_input["path"], tool_input.get("content", ""))
     elif tool_name == "write_to_file":
-        return write_to_file(tool_input["path"], tool_input["content"])
+        return write_to_file(tool_input["path"], tool_input["content"], tool_input.get("show_diff", False))
+    elif tool_name == "edit_file":
+        return edit_file(tool_input["path"], tool_input.get("edits"), tool_input.get("diff"), tool_input.get("show_diff", False))
     elif tool_name == "read_file":
-        return read_file(tool_input["path"])
+        return read_file(tool_input["path"], tool_input.get("offset", 1), tool_input.get("limit", READ_FILE_DEFAULT_LINES))
     elif tool_name == "list_files":
-        return list_files(tool_input.get("path", "."))
+        return list_files(tool_input.get("path", "."), tool_input.get("depth"), tool_input.get("pattern"))
+    elif tool_name == "search_code":
+        return search_code(tool_input["query"], tool_input.get("path", "."), tool_input.get("regex", False), tool_input.get("case_sensitive"), tool_input.get("include"), tool_input.get("context", 0))
+    elif tool_name == "find_symbol":
+        return find_symbol(tool_input["name"], tool_input.get("path", "."), tool_input.get("kind"), tool_input.get("references", False), tool_input.get("include_source", True))
     elif tool_name == "tavily_search":
         return tavily_search(tool_input["query"])
+    elif tool_name == "multi_search":
+        return multi_search(tool_input["queries"], max_results=tool_input.get("max_results", MULTI_SEARCH_MAX_RESULTS))
     else:
         return f"Unknown tool: {tool_name}"
+
+async def aexecute_tool(tool_name, tool_input):
+    # The tool implementations block on disk and network, so they run on worker threads
+    # and the event loop stays free to stream and render in the meantime; with a cassette
+    # active the call is recorded, or answered from the recording
+    return await asyncio.to_thread(run_tool, execute_tool, tool_name, tool_input)
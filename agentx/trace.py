@@ -0,0 +1,183 @@
+# trace.py
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from agentx.config import AGENTX_HOME, TRACE_ENABLED
+
+TRACE_DIR = os.path.join(AGENTX_HOME, "traces")
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+_lock = threading.Lock()
+
+def trace_path(session_id):
+    return os.path.join(TRACE_DIR, f"{session_id}.jsonl")
+
+def usage_fields(usage):
+    # Cache fields are missing or None when caching did not apply
+    return {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+
+class TurnTrace:
+    """Timed spans of one turn, appended to the session's trace file when the turn ends.
+
+    Span names: "build" (compaction and request assembly), "ttft" (request sent until the
+    first token), "stream" (first token until the final message, with the request's usage),
+    "render" (terminal output), "tools" (wall time of a batch of tool calls), "tool" (one
+    call) and "retry" (a failed model request and the wait after it). Every span carries the index of the request it belongs to; requests after the
+    first are the follow-ups of the tool loop.
+    """
+
+    def __init__(self, session_id, turn, **attrs):
+        self.session_id = session_id
+        self.turn = turn
+        self.attrs = attrs
+        self.time = time.time()
+        self.start = time.perf_counter()
+        self.spans = []
+        self.totals = {}
+
+    def add(self, name, start, duration, **attrs):
+        self.spans.append({"name": name, "start": round(start - self.start, 6), "duration": round(duration, 6), **attrs})
+
+    @contextmanager
+    def span(self, name, **attrs):
+        # Attributes known only at the end (usage, errors) can be set on the yielded dict
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.add(name, start, time.perf_counter() - start, **attrs)
+
+    @contextmanager
+    def accumulate(self, name):
+        # Work spread over many short calls, such as rendering stream deltas, adds up to one span
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            total = self.totals.setdefault(name, [start, 0.0])
+            total[1] += time.perf_counter() - start
+
+    def total(self, name):
+        return self.totals[name][1] if name in self.totals else 0.0
+
+    def flush_total(self, name, **attrs):
+        total = self.totals.pop(name, None)
+        if total is not None:
+            self.add(name, total[0], total[1], **attrs)
+
+    def finish(self, status="ok"):
+        if not TRACE_ENABLED:
+            return
+        for name in list(self.totals):
+            self.flush_total(name)
+        head = {"session": self.session_id, "turn": self.turn}
+        records = [{"type": "span", **head, **span} for span in self.spans]
+        records.append({
+            "type": "turn",
+            **head,
+            **self.attrs,
+            "time": self.time,
+            "duration": round(time.perf_counter() - self.start, 6),
+            "status": status,
+            "requests": sum(1 for span in self.spans if span["name"] == "stream"),
+            **{field: sum(span.get(field, 0) for span in self.spans) for field in USAGE_FIELDS},
+        })
+        try:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            with _lock, open(trace_path(self.session_id), "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+        except OSError:
+            # A trace that cannot be written must not fail the turn
+            pass
+
+def trace_files():
+    try:
+        names = [name for name in os.listdir(TRACE_DIR) if name.endswith(".jsonl")]
+    except FileNotFoundError:
+        return []
+    paths = [os.path.join(TRACE_DIR, name) for name in names]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+def read_trace(path):
+    spans, turns = [], []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            (turns if record.get("type") == "turn" else spans).append(record)
+    return spans, turns
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def format_duration(seconds):
+    if seconds >= 60:
+        return f"{int(seconds // 60)}m{seconds % 60:04.1f}s"
+    return f"{seconds:.2f}s"
+
+def summarize(spans, turns, top=5):
+    """Human-readable breakdown of where the time of the given turns went."""
+    if not turns:
+        return "No traced turns."
+    total = sum(turn["duration"] for turn in turns)
+    by_name = {}
+    for span in spans:
+        by_name.setdefault(span["name"], []).append(span)
+
+    def seconds(name, **match):
+        return sum(span["duration"] for span in by_name.get(name, []) if all(span.get(k) == v for k, v in match.items()))
+
+    # Rendering happens while the stream is open; it is counted as terminal time, not model time
+    render_in_stream = sum(span.get("render", 0) for span in by_name.get("stream", []))
+    model = seconds("ttft") + seconds("stream") - render_in_stream
+    categories = [
+        ("model", model),
+        ("tools", seconds("tools")),
+        ("terminal", seconds("render")),
+        ("request build", seconds("build")),
+        ("retries", seconds("retry")),
+    ]
+    categories.append(("other", max(0.0, total - sum(value for _, value in categories))))
+
+    requests = by_name.get("stream", [])
+    followups = [span for span in requests if span.get("request", 0) > 0]
+    ttfts = [span["duration"] for span in by_name.get("ttft", [])]
+    lines = [f"{len(turns)} turns, {len(requests)} requests ({len(followups)} follow-ups), {format_duration(total)} in total"]
+    lines.append("")
+    for name, value in categories:
+        lines.append(f"  {name:14} {format_duration(value):>10} {value / total * 100 if total else 0:5.1f}%")
+    lines.append("")
+    lines.append(f"  time to first token: median {format_duration(percentile(ttfts, 0.5))}, p95 {format_duration(percentile(ttfts, 0.95))}")
+    followup_time = sum(span["duration"] - span.get("render", 0) for span in by_name.get("ttft", []) + followups if span.get("request", 0) > 0)
+    lines.append(f"  model time in follow-up requests: {format_duration(followup_time)}")
+
+    usage = {field: sum(turn.get(field, 0) for turn in turns) for field in USAGE_FIELDS}
+    prompt = usage["input_tokens"] + usage["cache_creation_input_tokens"] + usage["cache_read_input_tokens"]
+    hit_rate = usage["cache_read_input_tokens"] / prompt * 100 if prompt else 0
+    lines.append("")
+    lines.append(f"  tokens: {usage['input_tokens']} input, {usage['output_tokens']} output, "
+                 f"{usage['cache_creation_input_tokens']} cache write, {usage['cache_read_input_tokens']} cache read ({hit_rate:.0f}% of prompt tokens from cache)")
+
+    tools = {}
+    for span in by_name.get("tool", []):
+        tools.setdefault(span["tool"], []).append(span["duration"])
+    if tools:
+        lines.append("")
+        lines.append(f"  {'tool':20} {'calls':>6} {'total':>10} {'median':>10} {'max':>10}")
+        for name, durations in sorted(tools.items(), key=lambda item: -sum(item[1]))[:top]:
+            lines.append(f"  {name:20} {len(durations):>6} {format_duration(sum(durations)):>10} {format_duration(percentile(durations, 0.5)):>10} {format_duration(max(durations)):>10}")
+
+    lines.append("")
+    lines.append("  slowest turns:")
+    for turn in sorted(turns, key=lambda turn: -turn["duration"])[:top]:
+        label = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(turn["time"]))
+        lines.append(f"  {label}  {turn['session']} turn {turn['turn']:<4} {format_duration(turn['duration']):>10}  {turn['requests']} requests  {turn['status']}")
+    return "\n".join(lines)
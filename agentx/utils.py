@@ -1,113 +1,307 @@
 # utils.py
 
 import os
-import base64
-from PIL import Image
-import io
+import mmap
+import contextvars
 import re
 from colorama import Fore, Style
-from pygments import highlight
-from pygments.lexers import get_lexer_by_name
-from pygments.formatters import TerminalFormatter
-import difflib
 import textwrap
 import time
-from agentx.config import CLAUDE_COLOR, TOOL_COLOR, RESULT_COLOR
+from agentx.config import CLAUDE_COLOR, TOOL_COLOR, RESULT_COLOR, READ_FILE_DEFAULT_LINES, READ_FILE_MAX_BYTES, READ_FILE_MMAP_THRESHOLD
+from agentx.render import get_lexer, highlight_code
+from agentx.diffing import summarize_change
+from agentx.journal import safe_write, safe_mkdir
+from agentx.listing import list_files
+from agentx.codeindex import search_code
+from agentx.symbols import find_symbol
+from agentx.search import tavily_search, multi_search
 
-def update_system_prompt(current_iteration=None, max_iterations=None):
-    global system_prompt
+# System prompt
+system_prompt = """
+You are Claude, an AI assistant powered by Anthropic's Claude-3.5-Sonnet model. You are an exceptional software developer with vast knowledge across multiple programming languages, frameworks, and best practices. Your capabilities include:
+
+1. Creating project structures, including folders and files
+2. Writing clean, efficient, and well-documented code
+3. Debugging complex issues and providing detailed explanations
+4. Offering architectural insights and design patterns
+5. Staying up-to-date with the latest technologies and industry trends
+6. Reading and analyzing existing files in the project directory
+7. Listing files in the root directory of the project and searching file contents with search_code
+8. Performing web searches to get up-to-date information or additional context
+9. When you use search make sure you use the best query to get the most accurate and up-to-date information
+10. IMPORTANT!! When changing part of an existing file, use the edit_file tool with targeted search/replace edits instead of resending the whole file. Use write_to_file only for new files or complete rewrites.
+11. Analyzing images provided by the user
+When an image is provided, carefully analyze its contents and incorporate your observations into your responses.
+
+When asked to create a project:
+- Always start by creating a root folder for the project.
+- Then, create the necessary subdirectories and files within that root folder.
+- Organize the project structure logically and follow best practices for the specific type of project being created.
+- Use the provided tools to create folders and files as needed.
+
+When asked to make edits or improvements:
+- Use the find_symbol tool to get the source of a Python function, class or method (and where it is used) without reading the whole file.
+- Use the search_code tool to find where something is defined or used, then read_file with offset and limit to read just that part.
+- Use the read_file tool to examine the contents of existing files.
+- Analyze the code and suggest improvements or make necessary edits.
+- Use the edit_file tool to implement targeted changes, quoting just enough of the original text to identify each spot uniquely.
+- Use the write_to_file tool only when replacing the whole file, providing the full updated file content.
+
+Be sure to consider the type of project (e.g., Python, JavaScript, web application) when determining the appropriate structure and files to include.
+
+You can now read files, list the contents of the root folder where this script is being run, and perform web searches. Use these capabilities when:
+- The user asks for edits or improvements to existing files
+- You need to understand the current state of the project
+- You believe reading a file or listing directory contents will be beneficial to accomplish the user's goal
+- You need up-to-date information or additional context to answer a question accurately
+
+When you need current information or feel that a search could provide a better answer, use the tavily_search tool. This tool performs a web search and returns a concise answer along with relevant sources. When a question needs several queries, pass them all to one multi_search call instead of searching one query at a time.
+
+Always strive to provide the most accurate, helpful, and detailed responses possible. If you're unsure about something, admit it and consider using the search tool to find the most current information.
+
+When in automode:
+1. Set clear, achievable goals for yourself based on the user's request
+2. Work through these goals one by one, using the available tools as needed
+3. REMEMBER!! You can Read files, write code, LIST the files, and even SEARCH and make edits, use these tools as necessary to accomplish each goal
+4. ALWAYS READ A FILE BEFORE EDITING IT IF YOU ARE MISSING CONTENT. Provide regular updates on your progress
+5. IMPORTANT RULe!! When you know your goals are completed, DO NOT CONTINUE IN POINTLESS BACK AND FORTH CONVERSATIONS with yourself, if you think we achieved the results established to the original request say "AUTOMODE_COMPLETE" in your response to exit the loop!
+6. ULTRA IMPORTANT! The current iteration and the total number of iterations you have to complete the request are given in a note at the end of the latest user message, you can use this information to make decisions and to provide updates on your progress knowing the amount of responses you have left to complete the request.
+Answer the user's request using relevant tools (if they are available). Before calling a tool, do some analysis within <thinking></thinking> tags. First, think about which of the provided tools is the relevant tool to answer the user's request. Second, go through each of the required parameters of the relevant tool and determine if the user has directly provided or given enough information to infer a value. When deciding if the parameter can be inferred, carefully consider all the context to see if it supports a specific value. If all of the required parameters are present or can be reasonably inferred, close the thinking tag and proceed with the tool call. BUT, if one of the values for a required parameter is missing, DO NOT invoke the function (not even with fillers for the missing params) and instead, ask the user to provide the missing parameters. DO NOT ask for more information on optional parameters if it is not provided.
+
+"""
+
+def update_system_prompt():
+    # The prompt stays byte-identical across requests and is marked for prompt caching;
+    # tools are sent before the system prompt, so this breakpoint caches the tool schemas too
+    return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+def session_status(current_iteration=None, max_iterations=None, automode=False):
+    # Changes from one iteration to the next, so it is sent after the cached prefix, at the
+    # end of the newest user message, rather than in the system prompt
     automode_status = "You are currently in automode." if automode else "You are not in automode."
     iteration_info = ""
     if current_iteration is not None and max_iterations is not None:
         iteration_info = f"You are currently on iteration {current_iteration} out of {max_iterations} in automode."
-    return system_prompt.format(automode_status=automode_status, iteration_info=iteration_info)
+    return f"{automode_status} {iteration_info}".strip()
+
+# Where print_colored and print_code write (None: stdout); sessions with an output of their
+# own, such as batch tasks, set it for their turns
+current_output = contextvars.ContextVar("current_output", default=None)
 
 def print_colored(text, color):
-    print(f"{color}{text}{Style.RESET_ALL}")
+    print(f"{color}{text}{Style.RESET_ALL}", file=current_output.get())
 
 def print_code(code, language):
-    try:
-        lexer = get_lexer_by_name(language, stripall=True)
-        formatted_code = highlight(code, lexer, TerminalFormatter())
-        print(formatted_code)
-    except pygments.util.ClassNotFound:
+    lexer = get_lexer(language)
+    if lexer is None:
         print_colored(f"Code (language: {language}):\n{code}", CLAUDE_COLOR)
+        return
+    print(highlight_code(code.strip(), language), file=current_output.get())
 
 def create_folder(path):
     try:
-        os.makedirs(path, exist_ok=True)
+        safe_mkdir(path)
         return f"Folder created: {path}"
     except Exception as e:
         return f"Error creating folder: {str(e)}"
 
 def create_file(path, content=""):
     try:
-        with open(path, 'w') as f:
-            f.write(content)
+        safe_write(path, content)
         return f"File created: {path}"
     except Exception as e:
         return f"Error creating file: {str(e)}"
 
-def generate_and_apply_diff(original_content, new_content, path):
-    diff = list(difflib.unified_diff(
-        original_content.splitlines(keepends=True),
-        new_content.splitlines(keepends=True),
-        fromfile=f"a/{path}",
-        tofile=f"b/{path}",
-        n=3
-    ))
-    
-    if not diff:
+def generate_and_apply_diff(original_content, new_content, path, show_diff=False, newline=None):
+    change = summarize_change(original_content, new_content, path, show_diff)
+
+    if change is None:
         return "No changes detected."
     
     try:
-        with open(path, 'w') as f:
-            f.writelines(new_content)
-        return f"Changes applied to {path}:\n" + ''.join(diff)
+        safe_write(path, new_content, newline)
+        return f"Changes applied to {path}: {change}"
     except Exception as e:
         return f"Error applying changes: {str(e)}"
 
-def write_to_file(path, content):
+def write_to_file(path, content, show_diff=False):
     try:
         if os.path.exists(path):
             with open(path, 'r') as f:
                 original_content = f.read()
-            result = generate_and_apply_diff(original_content, content, path)
+            result = generate_and_apply_diff(original_content, content, path, show_diff)
         else:
-            with open(path, 'w') as f:
-                f.write(content)
+            safe_write(path, content)
             result = f"New file created and content written to: {path}"
         return result
     except Exception as e:
         return f"Error writing to file: {str(e)}"
 
-def read_file(path):
+def parse_unified_diff(diff_text):
+    # Turns each @@ hunk into an (old_text, new_text) pair; line numbers are ignored and the
+    # hunk is located by its context instead, so a diff against a slightly stale view still applies
+    hunks = []
+    old_lines = new_lines = None
+    for line in diff_text.splitlines(keepends=True):
+        if line.startswith("@@"):
+            if old_lines is not None:
+                hunks.append(("".join(old_lines), "".join(new_lines)))
+            old_lines, new_lines = [], []
+        elif old_lines is None or line.startswith("---") or line.startswith("+++"):
+            continue
+        elif line.startswith("\\"):
+            # "\ No newline at end of file" applies to the line before it
+            if old_lines and old_lines[-1].endswith("\n"):
+                old_lines[-1] = old_lines[-1][:-1]
+            if new_lines and new_lines[-1].endswith("\n"):
+                new_lines[-1] = new_lines[-1][:-1]
+        elif line.startswith("-"):
+            old_lines.append(line[1:])
+        elif line.startswith("+"):
+            new_lines.append(line[1:])
+        else:
+            text = line[1:] if line.startswith(" ") else line
+            old_lines.append(text)
+            new_lines.append(text)
+    if old_lines is not None:
+        hunks.append(("".join(old_lines), "".join(new_lines)))
+    return hunks
+
+def edit_file(path, edits=None, diff=None, show_diff=False):
     try:
-        with open(path, 'r') as f:
-            content = f.read()
-        return content
+        # Line endings are kept as they are, so an edit only changes the text it targets
+        with open(path, 'r', newline='') as f:
+            original_content = f.read()
     except Exception as e:
-        return f"Error reading file: {str(e)}"
+        return f"Error editing file: {str(e)}"
+
+    hunks = [(edit.get("old_text", ""), edit.get("new_text", "")) for edit in edits or []]
+    if diff:
+        hunks.extend(parse_unified_diff(diff))
+    if not hunks:
+        return "Error editing file: provide edits or a diff."
+    if "\r\n" in original_content:
+        # Hunks written with plain \n still apply to a CRLF file, and keep its line endings
+        hunks = [
+            (old_text.replace("\n", "\r\n"), new_text.replace("\r\n", "\n").replace("\n", "\r\n"))
+            if old_text and old_text not in original_content and "\r" not in old_text else (old_text, new_text)
+            for old_text, new_text in hunks
+        ]
+
+    # Every anchor is checked against the original content before anything is written
+    report = []
+    matches = []
+    for number, (old_text, new_text) in enumerate(hunks, 1):
+        count = original_content.count(old_text) if old_text else 0
+        if not old_text:
+            report.append(f"Hunk {number}: failed, old_text is empty")
+        elif count == 0:
+            report.append(f"Hunk {number}: failed, old_text not found")
+        elif count > 1:
+            report.append(f"Hunk {number}: failed, old_text matches {count} times; include more surrounding lines")
+        else:
+            start = original_content.index(old_text)
+            matches.append((start, start + len(old_text), new_text, number))
+            report.append(f"Hunk {number}: ok")
+
+    matches.sort()
+    for (start, end, _, number), (next_start, _, _, next_number) in zip(matches, matches[1:]):
+        if next_start < end:
+            report.append(f"Hunk {next_number}: failed, overlaps hunk {number}")
 
-def list_files(path="."):
+    if any("failed" in line for line in report):
+        return f"No changes written to {path}:\n" + "\n".join(report)
+
+    # All hunks go into the file in a single write
+    pieces = []
+    position = 0
+    for start, end, new_text, _ in matches:
+        pieces.append(original_content[position:start])
+        pieces.append(new_text)
+        position = end
+    pieces.append(original_content[position:])
+    result = generate_and_apply_diff(original_content, "".join(pieces), path, show_diff, newline='')
+    return "\n".join(report) + "\n" + result
+
+def is_binary(sample):
+    if b"\0" in sample:
+        return True
     try:
-        files = os.listdir(path)
-        return "\n".join(files)
-    except Exception as e:
-        return f"Error listing files: {str(e)}"
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is still text
+        return e.start < len(sample) - 4
+    return False
+
+def find_line_start(data, line_number, chunk_size=1024 * 1024):
+    # Byte offset where 1-based line_number starts; counts newlines a chunk at a time so even
+    # memory-mapped files of hundreds of megabytes are scanned at C speed
+    remaining = line_number - 1
+    position = 0
+    size = len(data)
+    while remaining > 0 and position < size:
+        chunk = data[position:position + chunk_size]
+        count = chunk.count(b"\n")
+        if count < remaining:
+            remaining -= count
+            position += len(chunk)
+            continue
+        index = -1
+        for _ in range(remaining):
+            index = chunk.find(b"\n", index + 1)
+        return position + index + 1
+    return size if remaining > 0 else position
 
-def encode_image_to_base64(image_path):
+def count_lines(data, chunk_size=1024 * 1024):
+    lines = 0
+    for position in range(0, len(data), chunk_size):
+        lines += data[position:position + chunk_size].count(b"\n")
+    if len(data) and data[-1:] != b"\n":
+        lines += 1
+    return lines
+
+def read_file(path, offset=1, limit=READ_FILE_DEFAULT_LINES):
     try:
-        with Image.open(image_path) as img:
-            max_size = (1024, 1024)
-            img.thumbnail(max_size, Image.ANTIALIAS)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='JPEG')
-            return base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
+        offset = max(1, int(offset or 1))
+        limit = max(1, int(limit or READ_FILE_DEFAULT_LINES))
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            if is_binary(f.read(8192)):
+                return f"[{path}: binary file, {size} bytes, contents not shown]"
+            f.seek(0)
+            if size >= READ_FILE_MMAP_THRESHOLD:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = f.read()
+            try:
+                total_lines = count_lines(data)
+                start = find_line_start(data, offset)
+                end = find_line_start(data, offset + limit) if offset + limit <= total_lines else len(data)
+                truncated = end - start > READ_FILE_MAX_BYTES
+                if truncated:
+                    # Stop at the last full line that fits, unless a single line is already too long
+                    cut = data.rfind(b"\n", start, start + READ_FILE_MAX_BYTES)
+                    end = cut + 1 if cut >= start else start + READ_FILE_MAX_BYTES
+                chunk = data[start:end]
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
     except Exception as e:
-        return f"Error encoding image: {str(e)}"
+        return f"Error reading file: {str(e)}"
+
+    content = chunk.decode("utf-8", errors="replace")
+    if total_lines == 0:
+        return f"[{path}: empty file]"
+    if offset > total_lines:
+        return f"[{path}: {total_lines} lines, {size} bytes; offset {offset} is past the end of the file]"
+    shown_lines = content.count("\n") + (0 if content.endswith("\n") else 1)
+    last_line = min(offset + shown_lines - 1, total_lines)
+    header = f"[{path}: {total_lines} lines, {size} bytes; showing lines {offset}-{last_line}"
+    if truncated and not content.endswith("\n"):
+        header += f"; line {last_line} cut at {READ_FILE_MAX_BYTES} bytes"
+    if last_line < total_lines:
+        header += f"; continue with offset={last_line + 1}"
+    return header + "]\n" + content
 
 def parse_goals(response):
     goals = re.findall(r'Goal \d+: (.+)', response)
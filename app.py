@@ -2,19 +2,15 @@ import os
 from datetime import datetime
 import json
 from colorama import init, Fore, Style
-from pygments import highlight
-from pygments.lexers import get_lexer_by_name
-from pygments.formatters import TerminalFormatter
-from tavily import TavilyClient
-import pygments.util
 import base64
-from PIL import Image
 import io
 import re
-from anthropic import Anthropic
 import difflib
 import textwrap
-import time
+import functools
+from agentx.executor import execute_tools
+from agentx.search import tavily_search
+from agentx.render import StreamRenderer, get_lexer, highlight_code, truncate_output
 
 # Initialize colorama
 init()
@@ -29,17 +25,32 @@ RESULT_COLOR = Fore.GREEN
 CONTINUATION_EXIT_PHRASE = "AUTOMODE_COMPLETE"
 MAX_CONTINUATION_ITERATIONS = 25
 
-# Initialize the Anthropic client
-client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
-
-# Initialize the Tavily client
-tavily = TavilyClient(api_key=os.environ.get("TAVILY_API_KEY"))
-
-# Set up the conversation memory
-conversation_history = []
+# The Anthropic client is created on first use, so the script starts without importing anthropic
+client = None
+
+def get_client():
+    global client
+    if client is None:
+        from anthropic import Anthropic
+        from agentx.cassette import get_cassette
+        from agentx.config import RETRY_MAX_ATTEMPTS
+        # The SDK's own retries (429, 529, 5xx and connection errors, honoring retry-after)
+        # cover requests that fail before the stream starts
+        options = {"max_retries": RETRY_MAX_ATTEMPTS - 1}
+        # With AGENTX_CASSETTE set, model traffic is recorded to or replayed from a cassette
+        cassette = get_cassette()
+        if cassette is None:
+            client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"), **options)
+        else:
+            api_key = os.environ.get("ANTHROPIC_API_KEY") or ("replay" if cassette.mode == "replay" else None)
+            client = Anthropic(api_key=api_key, http_client=cassette.http_client(), **options)
+    return client
 
-# automode flag
-automode = False
+class ChatSession:
+    # The state of one conversation; main() runs one, other callers can keep as many as they need
+    def __init__(self):
+        self.conversation_history = []
+        self.automode = False
 
 # System prompt
 system_prompt = """
@@ -81,37 +92,39 @@ When you need current information or feel that a search could provide a better a
 
 Always strive to provide the most accurate, helpful, and detailed responses possible. If you're unsure about something, admit it and consider using the search tool to find the most current information.
 
-{automode_status}
-
 When in automode:
 1. Set clear, achievable goals for yourself based on the user's request
 2. Work through these goals one by one, using the available tools as needed
 3. REMEMBER!! You can Read files, write code, LIST the files, and even SEARCH and make edits, use these tools as necessary to accomplish each goal
 4. ALWAYS READ A FILE BEFORE EDITING IT IF YOU ARE MISSING CONTENT. Provide regular updates on your progress
 5. IMPORTANT RULe!! When you know your goals are completed, DO NOT CONTINUE IN POINTLESS BACK AND FORTH CONVERSATIONS with yourself, if you think we achieved the results established to the original request say "AUTOMODE_COMPLETE" in your response to exit the loop!
-6. ULTRA IMPORTANT! You have access to this {iteration_info} amount of iterations you have left to complete the request, you can use this information to make decisions and to provide updates on your progress knowing the amount of responses you have left to complete the request.
+6. ULTRA IMPORTANT! The current iteration and the total number of iterations you have to complete the request are given at the end of this prompt, you can use this information to make decisions and to provide updates on your progress knowing the amount of responses you have left to complete the request.
 Answer the user's request using relevant tools (if they are available). Before calling a tool, do some analysis within <thinking></thinking> tags. First, think about which of the provided tools is the relevant tool to answer the user's request. Second, go through each of the required parameters of the relevant tool and determine if the user has directly provided or given enough information to infer a value. When deciding if the parameter can be inferred, carefully consider all the context to see if it supports a specific value. If all of the required parameters are present or can be reasonably inferred, close the thinking tag and proceed with the tool call. BUT, if one of the values for a required parameter is missing, DO NOT invoke the function (not even with fillers for the missing params) and instead, ask the user to provide the missing parameters. DO NOT ask for more information on optional parameters if it is not provided.
 
 """
 
-def update_system_prompt(current_iteration=None, max_iterations=None):
-    global system_prompt
+def update_system_prompt(current_iteration=None, max_iterations=None, automode=False):
     automode_status = "You are currently in automode." if automode else "You are not in automode."
     iteration_info = ""
     if current_iteration is not None and max_iterations is not None:
         iteration_info = f"You are currently on iteration {current_iteration} out of {max_iterations} in automode."
-    return system_prompt.format(automode_status=automode_status, iteration_info=iteration_info)
+    # The static prompt stays byte-identical across requests and is marked for prompt caching;
+    # tools are sent before the system prompt, so this breakpoint caches the tool schemas too.
+    # Only the small status block after it changes from one iteration to the next.
+    return [
+        {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": f"{automode_status} {iteration_info}".strip()}
+    ]
 
 def print_colored(text, color):
     print(f"{color}{text}{Style.RESET_ALL}")
 
 def print_code(code, language):
-    try:
-        lexer = get_lexer_by_name(language, stripall=True)
-        formatted_code = highlight(code, lexer, TerminalFormatter())
-        print(formatted_code)
-    except pygments.util.ClassNotFound:
+    lexer = get_lexer(language)
+    if lexer is None:
         print_colored(f"Code (language: {language}):\n{code}", CLAUDE_COLOR)
+        return
+    print(highlight_code(code.strip(), language))
 
 def create_folder(path):
     try:
@@ -176,13 +189,6 @@ def list_files(path="."):
     except Exception as e:
         return f"Error listing files: {str(e)}"
 
-def tavily_search(query):
-    try:
-        response = tavily.qna_search(query=query, search_depth="advanced")
-        return response
-    except Exception as e:
-        return f"Error performing search: {str(e)}"
-
 tools = [
     {
         "name": "create_folder",
@@ -295,9 +301,10 @@ def execute_tool(tool_name, tool_input):
 
 def encode_image_to_base64(image_path):
     try:
+        from PIL import Image
         with Image.open(image_path) as img:
             max_size = (1024, 1024)
-            img.thumbnail(max_size, Image.ANTIALIAS)
+            img.thumbnail(max_size, Image.LANCZOS)
             if img.mode != 'RGB':
                 img = img.convert('RGB')
             img_byte_arr = io.BytesIO()
@@ -310,21 +317,40 @@ def parse_goals(response):
     goals = re.findall(r'Goal \d+: (.+)', response)
     return goals
 
-def execute_goals(goals):
-    global automode
+def execute_goals(session, goals):
     for i, goal in enumerate(goals, 1):
         print_colored(f"\nExecuting Goal {i}: {goal}", TOOL_COLOR)
-        response, _ = chat_with_claude(f"Continue working on goal: {goal}")
+        response, _ = chat_with_claude(session, f"Continue working on goal: {goal}")
         if CONTINUATION_EXIT_PHRASE in response:
-            automode = False
+            session.automode = False
             print_colored("Exiting automode.", TOOL_COLOR)
             break
 
 def format_text_for_cli(text, width=70):
     return "\n".join(textwrap.wrap(text, width))
 
-def chat_with_claude(user_input, image_path=None, current_iteration=None, max_iterations=None):
-    global conversation_history, automode
+def content_blocks(content):
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}]
+    return list(content)
+
+def build_messages(conversation_history):
+    # Ensure that roles alternate between "user" and "assistant"
+    messages = []
+    for msg in conversation_history:
+        if msg.get('content'):
+            if len(messages) == 0 or messages[-1]['role'] != msg['role']:
+                messages.append(msg)
+            else:
+                # Merge consecutive messages from the same role into one, without touching the history
+                messages[-1] = {
+                    "role": msg['role'],
+                    "content": content_blocks(messages[-1]['content']) + content_blocks(msg['content'])
+                }
+    return messages
+
+def chat_with_claude(session, user_input, image_path=None, current_iteration=None, max_iterations=None):
+    conversation_history = session.conversation_history
     
     if image_path:
         print_colored(f"Processing image at path: {image_path}", TOOL_COLOR)
@@ -356,84 +382,59 @@ def chat_with_claude(user_input, image_path=None, current_iteration=None, max_it
     else:
         conversation_history.append({"role": "user", "content": user_input})
     
-    # Ensure that roles alternate between "user" and "assistant"
-    messages = []
-    for msg in conversation_history:
-        if msg.get('content'):
-            if len(messages) == 0 or messages[-1]['role'] != msg['role']:
-                messages.append(msg)
-            else:
-                # Merge consecutive user messages into one
-                messages[-1]['content'] += "\n" + msg['content']
+    renderer = StreamRenderer()
 
     try:
         assistant_response = ""
-        with client.messages.stream(
-            model="claude-3-5-sonnet-20240620",
-            max_tokens=4000,
-            system=update_system_prompt(current_iteration, max_iterations),
-            messages=messages,
-            tools=tools,
-            tool_choice={"type": "auto"}
-        ) as stream:
-            exit_continuation = False
-            
-            for event in stream:
-                if event.type == "text":
-                    # Print each character with a delay to simulate typing
-                    for char in event.text:
-                        print(char, end='', flush=True)
-                        time.sleep(0.01)
-                    assistant_response += event.text
-                    if CONTINUATION_EXIT_PHRASE in event.text:
-                        exit_continuation = True
-                        break
-                elif event.type == "tool_use":
-                    tool_name = event.name
-                    tool_input = event.input
-                    tool_use_id = event.id
-
-                    print_colored(f"\nTool Used: {tool_name}", TOOL_COLOR)
-                    print_colored(f"Tool Input: {tool_input}", TOOL_COLOR)
-
-                    result = execute_tool(tool_name, tool_input)
-                    print_colored(f"Tool Result: {result}", RESULT_COLOR)
-
-                    conversation_history.append({"role": "assistant", "content": [event]})
-                    conversation_history.append({
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "tool_result",
-                                "tool_use_id": tool_use_id,
-                                "content": result
-                            }
-                        ]
-                    })
-
-                    tool_response = client.messages.create(
-                        model="claude-3-5-sonnet-20240620",
-                        max_tokens=4000,
-                        system=update_system_prompt(current_iteration, max_iterations),
-                        messages=[msg for msg in conversation_history if msg.get('content')],
-                        tools=tools,
-                        tool_choice={"type": "auto"}
-                    )
-
-                    for tool_content_block in tool_response.content:
-                        if tool_content_block.type == "text":
-                            for char in tool_content_block.text:
-                                print(char, end='', flush=True)
-                                time.sleep(0.01)
-                            assistant_response += tool_content_block.text
-            
+        exit_continuation = False
+
+        # Agent loop: stream a response, run every tool call it made, and stream the
+        # follow-up until the model stops asking for tools
+        while True:
+            with get_client().messages.stream(
+                model="claude-3-5-sonnet-20240620",
+                max_tokens=4000,
+                system=update_system_prompt(current_iteration, max_iterations, session.automode),
+                messages=build_messages(conversation_history),
+                tools=tools,
+                tool_choice={"type": "auto"}
+            ) as stream:
+                for event in stream:
+                    if event.type == "text":
+                        renderer.feed(event.text)
+                        assistant_response += event.text
+                        if CONTINUATION_EXIT_PHRASE in assistant_response:
+                            exit_continuation = True
+                    else:
+                        renderer.tick()
+
+                final_message = stream.get_final_message()
+            renderer.close()
+
+            conversation_history.append({"role": "assistant", "content": final_message.content})
+
+            tool_uses = [block for block in final_message.content if block.type == "tool_use"]
+            if final_message.stop_reason != "tool_use" or not tool_uses:
+                break
+
+            for tool_use in tool_uses:
+                print_colored(f"\nTool Used: {tool_use.name}", TOOL_COLOR)
+                print_colored(f"Tool Input: {truncate_output(tool_use.input)}", TOOL_COLOR)
+
+            # Independent tool calls run concurrently, results come back in call order; run_tool
+            # records them to (or answers them from) the cassette when one is active
+            from agentx.cassette import run_tool
+            tool_results = execute_tools(tool_uses, functools.partial(run_tool, execute_tool))
+            for tool_result in tool_results:
+                print_colored(f"Tool Result: {truncate_output(tool_result['content'])}", RESULT_COLOR)
+
+            conversation_history.append({"role": "user", "content": tool_results})
+
     except Exception as e:
+        renderer.close()
         print_colored(f"Error calling Claude API: {str(e)}", TOOL_COLOR)
         return "I'm sorry, there was an error communicating with the AI. Please try again.", False
-    
-    if assistant_response:
-        conversation_history.append({"role": "assistant", "content": assistant_response.strip()})
-    
+
     return "", exit_continuation  # Return empty string to avoid reprinting the response
 
 
@@ -461,7 +462,7 @@ def process_and_display_response(response):
             print_colored(response, CLAUDE_COLOR)
 
 def main():
-    global automode, conversation_history
+    session = ChatSession()
     print_colored("Welcome to the Claude-3.5-Sonnet Engineer Chat with Image Support!", CLAUDE_COLOR)
     print_colored("Type 'exit' to end the conversation.", CLAUDE_COLOR)
     print_colored("Type 'image' to include an image in your message.", CLAUDE_COLOR)
@@ -480,7 +481,7 @@ def main():
             
             if os.path.isfile(image_path):
                 user_input = input(f"{USER_COLOR}You (prompt for image): {Style.RESET_ALL}")
-                response, _ = chat_with_claude(user_input, image_path)
+                response, _ = chat_with_claude(session, user_input, image_path)
                 process_and_display_response(response)
             else:
                 print_colored("Invalid image path. Please try again.", CLAUDE_COLOR)
@@ -493,20 +494,20 @@ def main():
                 else:
                     max_iterations = MAX_CONTINUATION_ITERATIONS
                 
-                automode = True
+                session.automode = True
                 print_colored(f"Entering automode with {max_iterations} iterations. Press Ctrl+C to exit automode at any time.", TOOL_COLOR)
                 print_colored("Press Ctrl+C at any time to exit the automode loop.", TOOL_COLOR)
                 user_input = input(f"\n{USER_COLOR}You: {Style.RESET_ALL}")
                 
                 iteration_count = 0
                 try:
-                    while automode and iteration_count < max_iterations:
-                        response, exit_continuation = chat_with_claude(user_input, current_iteration=iteration_count+1, max_iterations=max_iterations)
+                    while session.automode and iteration_count < max_iterations:
+                        response, exit_continuation = chat_with_claude(session, user_input, current_iteration=iteration_count+1, max_iterations=max_iterations)
                         process_and_display_response(response)
                         
                         if exit_continuation or CONTINUATION_EXIT_PHRASE in response:
                             print_colored("Automode completed.", TOOL_COLOR)
-                            automode = False
+                            session.automode = False
                         else:
                             print_colored(f"Continuation iteration {iteration_count + 1} completed.", TOOL_COLOR)
                             print_colored("Press Ctrl+C to exit automode.", TOOL_COLOR)
@@ -516,23 +517,23 @@ def main():
                         
                         if iteration_count >= max_iterations:
                             print_colored("Max iterations reached. Exiting automode.", TOOL_COLOR)
-                            automode = False
+                            session.automode = False
                 except KeyboardInterrupt:
                     print_colored("\nAutomode interrupted by user. Exiting automode.", TOOL_COLOR)
-                    automode = False
+                    session.automode = False
                     # Ensure the conversation history ends with an assistant message
-                    if conversation_history and conversation_history[-1]["role"] == "user":
-                        conversation_history.append({"role": "assistant", "content": "Automode interrupted. How can I assist you further?"})
+                    if session.conversation_history and session.conversation_history[-1]["role"] == "user":
+                        session.conversation_history.append({"role": "assistant", "content": "Automode interrupted. How can I assist you further?"})
             except KeyboardInterrupt:
                 print_colored("\nAutomode interrupted by user. Exiting automode.", TOOL_COLOR)
-                automode = False
+                session.automode = False
                 # Ensure the conversation history ends with an assistant message
-                if conversation_history and conversation_history[-1]["role"] == "user":
-                    conversation_history.append({"role": "assistant", "content": "Automode interrupted. How can I assist you further?"})
+                if session.conversation_history and session.conversation_history[-1]["role"] == "user":
+                    session.conversation_history.append({"role": "assistant", "content": "Automode interrupted. How can I assist you further?"})
             
             print_colored("Exited automode. Returning to regular chat.", TOOL_COLOR)
         else:
-            response, _ = chat_with_claude(user_input)
+            response, _ = chat_with_claude(session, user_input)
             process_and_display_response(response)
 
 if __name__ == "__main__":
@@ -0,0 +1,137 @@
+# faults.py
+#
+# Checks how model requests survive failures, against the mock Messages API with injected faults:
+#
+#   python bench/faults.py                    # every scenario
+#   python bench/faults.py reset_mid_stream hedge
+#
+# Each scenario runs one turn in a fresh process, with faults injected into the requests it
+# sends (see bench/mock_api.py for the fault syntax). A scenario passes when the turn ends the
+# way it should (answered, or given up on for errors that retrying cannot fix) after the
+# expected number of requests, with the full response in the history and nothing shown twice.
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+TEXT = ("The build fails because the config loader reads the file before the environment is set up. "
+        "Moving the call into main() fixes it, and the tests pass again afterwards.")
+TOOL_SCRIPT = [
+    {"content": [{"type": "text", "text": "I'll write the fix. " + TEXT},
+                 {"type": "tool_use", "name": "create_file", "input": {"path": "fix.py", "content": "print('fixed')\n" * 20}}]},
+    {"content": [{"type": "text", "text": "Done. " + TEXT}]},
+]
+
+# faults: one per request; requests: how many the turn should send; error: whether it should give up
+SCENARIOS = {
+    "rate_limited": {"faults": ["429:0.2", "429:0.2"], "requests": 3},
+    "overloaded": {"faults": ["529"], "requests": 2},
+    "server_error": {"faults": ["500"], "requests": 2},
+    "reset_mid_stream": {"faults": ["reset:6"], "requests": 2},
+    "overloaded_mid_stream": {"faults": ["error:overloaded_error:6"], "requests": 2},
+    "reset_twice": {"faults": ["reset:4", "reset:4"], "requests": 3},
+    "reset_in_tool_call": {"faults": ["reset:16"], "script": TOOL_SCRIPT, "requests": 3},
+    "reset_in_follow_up": {"faults": ["ok", "reset:3"], "script": TOOL_SCRIPT, "requests": 3},
+    "read_timeout": {"faults": ["stall:3"], "env": {"AGENTX_READ_TIMEOUT": "1"}, "requests": 2},
+    "hedge": {"faults": ["stall:3"], "env": {"AGENTX_HEDGE_AFTER": "0.5"}, "requests": 2, "max_seconds": 2.0},
+    "bad_request": {"faults": ["400"], "requests": 1, "error": True},
+    "gives_up": {"faults": ["529", "529", "529"], "env": {"AGENTX_RETRY_ATTEMPTS": "3"}, "requests": 3, "error": True},
+}
+
+def history_text(history):
+    return "".join(
+        block.text for message in history if message["role"] == "assistant"
+        for block in message["content"] if block.type == "text"
+    )
+
+def run_child(name):
+    # Runs one scenario in this process and prints what happened as JSON
+    import io
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, BENCH_DIR)
+    from mock_api import MockMessagesServer
+    from agentx.conversation import chat_with_claude
+    from agentx.render import StreamRenderer
+
+    scenario = SCENARIOS[name]
+    script = scenario.get("script") or [{"content": [{"type": "text", "text": TEXT}]}]
+    server = MockMessagesServer(script, latency=0.05, tokens_per_second=400, faults=scenario["faults"]).start()
+    os.environ["ANTHROPIC_BASE_URL"] = server.url
+
+    out = io.StringIO()
+    history = []
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        response, _ = chat_with_claude("Why does the build fail?", None, history, False, renderer=StreamRenderer(mode="instant", out=out))
+    elapsed = time.perf_counter() - start
+    server.stop()
+    expected = "".join(block["text"] for response in script for block in response["content"] if block["type"] == "text")
+    print(json.dumps({
+        "error": response.startswith("I'm sorry"),
+        "requests": len(server.requests),
+        "seconds": elapsed,
+        "history_ok": history_text(history) == expected,
+        "shown_ok": out.getvalue().replace("\n", "") == expected,
+        "tool_ok": "script" not in scenario or os.path.exists("fix.py"),
+    }))
+
+def check(scenario, result):
+    problems = []
+    if result["error"] != scenario.get("error", False):
+        problems.append("gave up" if result["error"] else "did not give up")
+    if result["requests"] != scenario["requests"]:
+        problems.append(f"{result['requests']} requests, expected {scenario['requests']}")
+    if not scenario.get("error"):
+        if not result["history_ok"]:
+            problems.append("history differs from the response")
+        if not result["shown_ok"]:
+            problems.append("output differs from the response")
+        if not result["tool_ok"]:
+            problems.append("tool did not run")
+    if result["seconds"] > scenario.get("max_seconds", float("inf")):
+        problems.append(f"took longer than {scenario['max_seconds']}s")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="agentx fault-injection checks")
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    failed = False
+    for name in names:
+        scenario = SCENARIOS[name]
+        with tempfile.TemporaryDirectory(prefix=f"agentx-faults-{name}-") as workspace:
+            env = dict(os.environ, AGENTX_HOME=os.path.join(workspace, ".agentx-home"), ANTHROPIC_API_KEY="mock", **scenario.get("env", {}))
+            env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+            result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name], cwd=workspace, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"{name:24} FAIL  {result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'crashed'}")
+            failed = True
+            continue
+        outcome = json.loads(result.stdout.strip().splitlines()[-1])
+        problems = check(scenario, outcome)
+        failed = failed or bool(problems)
+        status = "FAIL" if problems else "ok  "
+        print(f"{name:24} {status}  {outcome['requests']} requests, {outcome['seconds']:.2f}s  {'; '.join(problems)}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
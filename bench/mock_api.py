@@ -0,0 +1,269 @@
+# mock_api.py
+#
+# A local stand-in for the Anthropic Messages API that plays back scripted responses.
+#
+#   python bench/mock_api.py --port 8900 --latency 0.3 --tokens-per-second 80
+#   ANTHROPIC_BASE_URL=http://127.0.0.1:8900 ANTHROPIC_API_KEY=mock agentx
+#
+# Each POST /v1/messages takes the next response from the script. A response is a dict
+# such as {"content": [{"type": "text", "text": "..."}, {"type": "tool_use", "name": "read_file",
+# "input": {"path": "a.py"}}]}. Streamed responses go out as server-sent events at the
+# configured token rate, after the configured time to first token. Once the script runs out,
+# every request gets a short text answer. Each request's size and timing is logged in
+# server.requests.
+#
+# A request that repeats an earlier one (a retry, or a hedged copy) gets the same response
+# again. When it ends in an assistant message, that text counts as a prefill and only the
+# rest of the response is sent, the way the real API continues a partial answer.
+#
+# Faults are injected one per request, in order, with --faults (or server.load(script, faults)):
+#
+#   429:2            answer with that HTTP error (429, 500, 529, ...), with retry-after: 2
+#   reset:5          drop the connection after 5 content deltas
+#   error:overloaded_error:5
+#                    send an SSE error event of that type after 5 content deltas
+#   stall:3          wait 3 seconds longer before answering
+#   ok               no fault
+
+import json
+import time
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ERROR_TYPES = {400: "invalid_request_error", 401: "authentication_error", 429: "rate_limit_error", 500: "api_error", 529: "overloaded_error"}
+
+CHARS_PER_TOKEN = 4
+TEXT_TOKENS_PER_DELTA = 3
+JSON_CHARS_PER_DELTA = 48
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+def split_text(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+def prefill_text(request):
+    messages = request.get("messages") or []
+    if not messages or messages[-1].get("role") != "assistant":
+        return ""
+    content = messages[-1].get("content")
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content if block.get("type") == "text")
+
+def request_key(request):
+    # The conversation without a trailing prefill: a resumed request asks for the same response
+    messages = request.get("messages") or []
+    if prefill_text(request):
+        messages = messages[:-1]
+    return hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+
+def parse_fault(fault):
+    # "429:2" -> ("status", 429, 2.0); "reset:5" -> ("reset", 5); "error:overloaded_error:5" -> ("error", "overloaded_error", 5)
+    parts = fault.split(":")
+    if parts[0].isdigit():
+        return ("status", int(parts[0]), float(parts[1]) if len(parts) > 1 else None)
+    if parts[0] == "reset":
+        return ("reset", int(parts[1]))
+    if parts[0] == "error":
+        return ("error", parts[1], int(parts[2]))
+    if parts[0] == "stall":
+        return ("stall", float(parts[1]))
+    if parts[0] == "ok":
+        return None
+    raise ValueError(f"Unknown fault {fault!r}")
+
+class MockMessagesServer:
+    def __init__(self, script=None, latency=0.2, tokens_per_second=100.0, port=0, faults=None):
+        self.script = list(script or [])
+        self.faults = [parse_fault(fault) for fault in faults or []]
+        self.answers = {}
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.requests = []
+        self.lock = threading.Lock()
+        self.tool_counter = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self.make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="mock-messages-api", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def load(self, script, faults=None):
+        with self.lock:
+            self.script = list(script)
+            self.faults = [parse_fault(fault) for fault in faults or []]
+
+    def next_fault(self):
+        with self.lock:
+            return self.faults.pop(0) if self.faults else None
+
+    def next_response(self, request):
+        key = request_key(request)
+        with self.lock:
+            if key in self.answers:
+                content, stop_reason = self.answers[key]
+            else:
+                response = self.script.pop(0) if self.script else {"content": [{"type": "text", "text": "Done."}]}
+                content = []
+                for block in response["content"]:
+                    if block["type"] == "tool_use":
+                        self.tool_counter += 1
+                        block = dict(block, id=block.get("id") or f"toolu_mock_{self.tool_counter:06d}")
+                    content.append(block)
+                stop_reason = response.get("stop_reason") or ("tool_use" if any(block["type"] == "tool_use" for block in content) else "end_turn")
+                self.answers[key] = (content, stop_reason)
+        prefill = prefill_text(request)
+        if prefill and content and content[0]["type"] == "text" and content[0]["text"].startswith(prefill):
+            content = [dict(content[0], text=content[0]["text"][len(prefill):])] + content[1:]
+        return content, stop_reason
+
+    def make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                received = time.time()
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not self.path.startswith("/v1/messages"):
+                    return self.send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+                request = json.loads(body or b"{}")
+                fault = server.next_fault()
+                with server.lock:
+                    server.requests.append({"time": received, "bytes": len(body), "messages": len(request.get("messages", [])), "stream": bool(request.get("stream")), "fault": fault})
+                input_tokens = len(body) // CHARS_PER_TOKEN
+                time.sleep(server.latency + (fault[1] if fault and fault[0] == "stall" else 0))
+                try:
+                    if fault and fault[0] == "status":
+                        return self.send_error_status(fault[1], fault[2])
+                    content, stop_reason = server.next_response(request)
+                    if request.get("stream"):
+                        self.stream(request, content, stop_reason, input_tokens, fault)
+                    else:
+                        self.send_json(200, self.message(request, content, stop_reason, input_tokens))
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up on the request (a hedged copy that lost, a timeout)
+                    self.close_connection = True
+
+            def message(self, request, content, stop_reason, input_tokens):
+                output_tokens = sum(len(json.dumps(block)) for block in content) // CHARS_PER_TOKEN
+                return {
+                    "id": f"msg_mock_{int(time.time() * 1000)}",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": request.get("model", "mock"),
+                    "content": content,
+                    "stop_reason": stop_reason,
+                    "stop_sequence": None,
+                    "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+                }
+
+            def send_json(self, status, payload, headers=()):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_error_status(self, status, retry_after):
+                error_type = ERROR_TYPES.get(status, "api_error")
+                headers = [("retry-after", f"{retry_after:g}")] if retry_after is not None else []
+                self.send_json(status, {"type": "error", "error": {"type": error_type, "message": f"Injected {status}"}}, headers)
+
+            def stream(self, request, content, stop_reason, input_tokens, fault=None):
+                # Chunked, like the real API, so a dropped connection shows up as an incomplete body
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                cut_after = fault[-1] if fault and fault[0] in ("reset", "error") else None
+                deltas = 0
+                message = self.message(request, [], None, input_tokens)
+                message["usage"]["output_tokens"] = 1
+                self.emit("message_start", {"type": "message_start", "message": message})
+                delay = 1.0 / server.tokens_per_second if server.tokens_per_second > 0 else 0
+                output_tokens = 0
+                for index, block in enumerate(content):
+                    if block["type"] == "text":
+                        self.emit("content_block_start", {"type": "content_block_start", "index": index, "content_block": {"type": "text", "text": ""}})
+                        for piece in split_text(block["text"], TEXT_TOKENS_PER_DELTA * CHARS_PER_TOKEN):
+                            deltas += 1
+                            if cut_after is not None and deltas > cut_after:
+                                return self.cut(fault)
+                            time.sleep(delay * TEXT_TOKENS_PER_DELTA)
+                            output_tokens += TEXT_TOKENS_PER_DELTA
+                            self.emit("content_block_delta", {"type": "content_block_delta", "index": index, "delta": {"type": "text_delta", "text": piece}})
+                    else:
+                        start = {"type": "tool_use", "id": block["id"], "name": block["name"], "input": {}}
+                        self.emit("content_block_start", {"type": "content_block_start", "index": index, "content_block": start})
+                        for piece in split_text(json.dumps(block["input"]), JSON_CHARS_PER_DELTA):
+                            deltas += 1
+                            if cut_after is not None and deltas > cut_after:
+                                return self.cut(fault)
+                            tokens = max(1, len(piece) // CHARS_PER_TOKEN)
+                            time.sleep(delay * tokens)
+                            output_tokens += tokens
+                            self.emit("content_block_delta", {"type": "content_block_delta", "index": index, "delta": {"type": "input_json_delta", "partial_json": piece}})
+                    self.emit("content_block_stop", {"type": "content_block_stop", "index": index})
+                self.emit("message_delta", {"type": "message_delta", "delta": {"stop_reason": stop_reason, "stop_sequence": None}, "usage": {"output_tokens": output_tokens}})
+                self.emit("message_stop", {"type": "message_stop"})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def cut(self, fault):
+                if fault[0] == "error":
+                    self.emit("error", {"type": "error", "error": {"type": fault[1], "message": "Injected error event"}})
+                    self.wfile.write(b"0\r\n\r\n")
+                # A reset just stops: the connection closes without the final chunk
+
+            def emit(self, event, data):
+                data = sse(event, data)
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Anthropic Messages API")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--script", help="JSON file with a list of responses to play back")
+    parser.add_argument("--faults", default="", help="comma-separated faults to inject, one per request (see above)")
+    args = parser.parse_args()
+    script = []
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+    server = MockMessagesServer(script, args.latency, args.tokens_per_second, args.port, [fault for fault in args.faults.split(",") if fault])
+    print(f"Mock Messages API listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# run.py
+#
+# End-to-end benchmarks of the agent loop against the mock Messages API in bench/mock_api.py:
+#
+#   python bench/run.py                          # every scenario, 3 runs each
+#   python bench/run.py scaffold large_read --runs 5 --latency 0.5 --tokens-per-second 60
+#   python bench/run.py --save baseline.json
+#   python bench/run.py --compare baseline.json --tolerance 0.2
+#
+# Every run is a fresh process with its own workspace and AGENTX_HOME, driving
+# chat_with_claude (and the automode loop) the way the CLI does. Reported per scenario:
+# time to first token, turn latency, time spent in tools, request bytes sent per turn, and
+# the peak memory of the process. With --compare, metrics that got worse by more than the
+# tolerance are flagged and the exit status is 1.
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+def text(words):
+    return " ".join(f"word{i % 97}" for i in range(words)) + "."
+
+def tool(tool_name, **tool_input):
+    return {"type": "tool_use", "name": tool_name, "input": tool_input}
+
+def python_module(index, functions=40):
+    return "\n\n".join(
+        f"def function_{index}_{i}(value):\n    # Step {i} of module {index}\n    result = value * {i} + {index}\n    return result\n"
+        for i in range(functions)
+    )
+
+# A scenario is setup(workspace) -> list of turns; a turn is (user input, scripted responses)
+
+def scaffold(workspace):
+    files = [f"app/src/module_{i}.py" for i in range(8)] + ["app/README.md", "app/requirements.txt"]
+    return [("Create a small Python project called app.", [
+        {"content": [{"type": "text", "text": "I'll set up the project structure first. " + text(40)},
+                     tool("create_folder", path="app"), tool("create_folder", path="app/src"), tool("create_folder", path="app/tests")]},
+        {"content": [{"type": "text", "text": "Now the files. " + text(20)}]
+                    + [tool("create_file", path=path, content=python_module(i, 6)) for i, path in enumerate(files)]},
+        {"content": [{"type": "text", "text": "The project is ready.\n\n```python\nfrom src import module_0\n```\n" + text(200)}]},
+    ])]
+
+def multi_file_edit(workspace):
+    paths = [f"pkg/module_{i}.py" for i in range(6)]
+    os.makedirs(os.path.join(workspace, "pkg"))
+    for i, path in enumerate(paths):
+        with open(os.path.join(workspace, path), "w") as f:
+            f.write(python_module(i, 80))
+    edits = [
+        tool("edit_file", path=path, edits=[
+            {"old_text": f"    # Step 3 of module {i}\n", "new_text": f"    # Step 3 of module {i}, now validated\n    assert value is not None\n"},
+            {"old_text": f"    result = value * 50 + {i}\n", "new_text": f"    result = (value * 50 + {i}) % 1000\n"},
+        ])
+        for i, path in enumerate(paths)
+    ]
+    return [("Validate inputs in every module of pkg.", [
+        {"content": [{"type": "text", "text": "Let me look at the modules. " + text(30)}] + [tool("read_file", path=path) for path in paths]},
+        {"content": [{"type": "text", "text": "I'll make the changes. " + text(30)}] + edits},
+        {"content": [{"type": "text", "text": "All modules now validate their input. " + text(120)}]},
+    ])]
+
+def large_read(workspace):
+    with open(os.path.join(workspace, "server.log"), "w") as f:
+        for i in range(400000):
+            f.write(f"2024-06-01T12:{i % 60:02d}:00 {'ERROR' if i % 1000 == 7 else 'INFO'} request {i} handled in {i % 250} ms\n")
+    os.makedirs(os.path.join(workspace, "src"))
+    for i in range(30):
+        with open(os.path.join(workspace, "src", f"module_{i}.py"), "w") as f:
+            f.write(python_module(i, 60))
+    return [("Why do requests fail? Check server.log and the code.", [
+        {"content": [{"type": "text", "text": "Let me look at the log. " + text(20)},
+                     tool("read_file", path="server.log", offset=200000, limit=2000), tool("list_files", path=".", depth=2)]},
+        {"content": [{"type": "text", "text": "Searching the code. " + text(20)},
+                     tool("search_code", query="result = value * 17", include="*.py"), tool("find_symbol", name="function_12_17")]},
+        {"content": [{"type": "text", "text": "Found it. " + text(150)}]},
+    ])]
+
+def automode(workspace):
+    turns = []
+    for step in range(5):
+        done = step == 4
+        turns.append(("Build a todo CLI." if step == 0 else "Continue with the next step.", [
+            {"content": [{"type": "text", "text": f"Goal {step + 1}: " + text(40)},
+                         tool("write_to_file", path=f"todo/step_{step}.py", content=python_module(step, 8))]},
+            {"content": [{"type": "text", "text": text(60) + (" AUTOMODE_COMPLETE" if done else "")}]},
+        ]))
+    os.makedirs(os.path.join(workspace, "todo"))
+    return turns
+
+SCENARIOS = {"scaffold": scaffold, "multi_file_edit": multi_file_edit, "large_read": large_read, "automode": automode}
+
+def run_child(name, latency, tokens_per_second):
+    # Runs one scenario in this process and prints its measurements as JSON
+    import resource
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, BENCH_DIR)
+    from mock_api import MockMessagesServer
+    from agentx.conversation import chat_with_claude
+    from agentx.render import StreamRenderer
+    from agentx.store import SessionStore
+    import agentx.engine as engine
+
+    class TimingRenderer(StreamRenderer):
+        first_token_at = None
+
+        def feed(self, text):
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            super().feed(text)
+
+    tool_time = [0.0]
+    execute_tools = engine.aexecute_tools
+
+    async def timed_execute_tools(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await execute_tools(*args, **kwargs)
+        finally:
+            tool_time[0] += time.perf_counter() - start
+
+    engine.aexecute_tools = timed_execute_tools
+
+    workspace = os.getcwd()
+    turns = SCENARIOS[name](workspace)
+    server = MockMessagesServer([], latency, tokens_per_second).start()
+    os.environ["ANTHROPIC_BASE_URL"] = server.url
+    # The CLI creates the client while the user types the first prompt; so does the benchmark
+    engine.get_client()
+
+    store = SessionStore()
+    history = []
+    results = []
+    is_automode = name == "automode"
+    with open(os.devnull, "w") as devnull:
+        for index, (user_input, script) in enumerate(turns):
+            server.load(script)
+            requests_before = len(server.requests)
+            tool_time[0] = 0.0
+            renderer = TimingRenderer(out=devnull)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(devnull):
+                if is_automode:
+                    _, exit_continuation = chat_with_claude(user_input, None, history, True, index + 1, len(turns), store=store, renderer=renderer)
+                else:
+                    chat_with_claude(user_input, None, history, False, store=store, renderer=renderer)
+            end = time.perf_counter()
+            sent = server.requests[requests_before:]
+            results.append({
+                "ttft": (renderer.first_token_at or end) - start,
+                "latency": end - start,
+                "tool_time": tool_time[0],
+                "requests": len(sent),
+                "bytes_sent": sum(request["bytes"] for request in sent),
+            })
+            if is_automode and exit_continuation:
+                break
+    server.stop()
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"turns": results, "peak_rss_mb": peak_kb / 1024}))
+
+def run_scenario(name, runs, latency, tokens_per_second):
+    samples = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory(prefix=f"agentx-bench-{name}-") as workspace:
+            home = os.path.join(workspace, ".agentx-home")
+            env = dict(os.environ, AGENTX_HOME=home, ANTHROPIC_API_KEY="mock", AGENTX_RENDER="frames")
+            env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+            command = [sys.executable, os.path.abspath(__file__), "--child", name, "--latency", str(latency), "--tokens-per-second", str(tokens_per_second)]
+            result = subprocess.run(command, cwd=workspace, env=env, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"{name} failed:\n{result.stderr}")
+            samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    turns = [turn for sample in samples for turn in sample["turns"]]
+    return {
+        "ttft_ms": statistics.median(turn["ttft"] for turn in turns) * 1000,
+        "turn_latency_ms": statistics.median(turn["latency"] for turn in turns) * 1000,
+        "tool_time_ms": statistics.median(turn["tool_time"] for turn in turns) * 1000,
+        "requests_per_turn": statistics.mean(turn["requests"] for turn in turns),
+        "bytes_per_turn": statistics.mean(turn["bytes_sent"] for turn in turns),
+        "max_bytes_per_turn": max(turn["bytes_sent"] for turn in turns),
+        "peak_rss_mb": max(sample["peak_rss_mb"] for sample in samples),
+    }
+
+COLUMNS = [("ttft_ms", "TTFT ms"), ("turn_latency_ms", "turn ms"), ("tool_time_ms", "tools ms"),
+           ("requests_per_turn", "req/turn"), ("bytes_per_turn", "bytes/turn"), ("max_bytes_per_turn", "max bytes"), ("peak_rss_mb", "peak MB")]
+
+def main():
+    parser = argparse.ArgumentParser(description="agentx end-to-end benchmarks")
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock API seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=400.0, help="Mock API output rate")
+    parser.add_argument("--save", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="compare against results saved earlier")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression with --compare")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.latency, args.tokens_per_second)
+        return
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    baseline = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(f"{'scenario':16}" + "".join(f"{label:>12}" for _, label in COLUMNS))
+    results = {}
+    regressions = []
+    for name in names:
+        results[name] = metrics = run_scenario(name, args.runs, args.latency, args.tokens_per_second)
+        print(f"{name:16}" + "".join(f"{metrics[key]:>12.1f}" for key, _ in COLUMNS))
+        for key, label in COLUMNS:
+            before = baseline.get(name, {}).get(key)
+            if before and metrics[key] > before * (1 + args.tolerance):
+                regressions.append(f"{name}: {label} {before:.1f} -> {metrics[key]:.1f}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if regressions:
+        print("\nRegressions beyond the tolerance:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
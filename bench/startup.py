@@ -0,0 +1,83 @@
+# startup.py
+#
+# Startup-time benchmark for the agentx entry point and app.py:
+#
+#   python bench/startup.py              # 10 runs each, fails above the budget
+#   python bench/startup.py --runs 30 --budget 0.2
+#
+# Every run starts a fresh interpreter, so nothing is shared between runs. The run fails
+# (exit status 1) when the median time goes over the budget, or when a module that should
+# only load on first use (anthropic, PIL, pygments, ...) is imported at startup.
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported before the first turn needs them
+LAZY_MODULES = ["anthropic", "httpx", "PIL", "pygments", "requests", "tavily", "litellm"]
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+TARGETS = {
+    "import agentx.cli": "import agentx.cli",
+    "agentx --help": "import agentx.cli\ntry:\n    agentx.cli.parse_args(['--help'])\nexcept SystemExit:\n    pass",
+    "import app": "import app",
+}
+
+def measure(statement, runs):
+    code = PROBE.format(statement=statement, lazy=LAZY_MODULES)
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    wall_times = []
+    import_times = []
+    loaded = set()
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+        wall_times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "probe failed")
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        import_times.append(report["elapsed"])
+        loaded.update(report["loaded"])
+    return wall_times, import_times, sorted(loaded)
+
+def main():
+    parser = argparse.ArgumentParser(description="agentx startup benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=0.25, help="Maximum median seconds per process")
+    args = parser.parse_args()
+
+    failed = False
+    for name, statement in TARGETS.items():
+        try:
+            wall_times, import_times, loaded = measure(statement, args.runs)
+        except RuntimeError as e:
+            print(f"{name:20} error: {e}")
+            failed = True
+            continue
+        # The budget applies to the whole process, interpreter start-up included
+        median = statistics.median(wall_times)
+        status = "ok"
+        if median > args.budget:
+            status = f"SLOW (budget {args.budget:.3f}s)"
+            failed = True
+        if loaded:
+            status = f"EAGER IMPORTS: {', '.join(loaded)}"
+            failed = True
+        print(f"{name:18} process median {median * 1000:6.1f} ms, min {min(wall_times) * 1000:6.1f} ms; imports median {statistics.median(import_times) * 1000:6.1f} ms  {status}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
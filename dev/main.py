@@ -1,4 +1,5 @@
 import os
+import sys
 from datetime import datetime
 import json
 from colorama import init, Fore, Style
@@ -11,8 +12,26 @@ from PIL import Image
 import io
 import re
 import difflib
-from litellm import completion
-import requests
+from litellm import completion, ModelResponse
+
+# Run as a script from a checkout, so the agentx package next to dev/ is importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agentx.search import searxng_search, multi_search
+from agentx.config import CASSETTE_PATH
+
+# With AGENTX_CASSETTE set, model calls and tool results are recorded to or replayed from a cassette;
+# agentx.cassette imports anthropic, so it is only loaded then
+if CASSETTE_PATH:
+    from agentx.cassette import get_cassette, run_tool
+    completion = get_cassette().wrap_call(
+        "litellm.completion",
+        completion,
+        encode=lambda response: response.model_dump() if hasattr(response, "model_dump") else dict(response),
+        decode=lambda data: ModelResponse(**data),
+    )
+else:
+    def run_tool(execute, tool_name, tool_input):
+        return execute(tool_name, tool_input)
 
 # Initialize colorama
 init()
@@ -81,6 +100,7 @@ Available tools:
 - read_file: Read the contents of a file at the specified path
 - list_files: List all files and directories in the specified path
 - searxng_search: Perform a web search using SearXNG API
+- multi_search: Run several SearXNG searches at once and get one merged, deduplicated list of results
 
 Example:
 Tool: create_folder
@@ -190,24 +210,6 @@ def list_files(path="."):
     except Exception as e:
         return f"Error listing files: {str(e)}"
 
-def searxng_search(query):
-    try:
-        searxng_url = os.environ.get('SEARXNG_URL', 'http://localhost:8888')
-        params = {
-            "q": query,
-            "format": "json"
-        }
-        response = requests.get(searxng_url, params=params)
-        results = response.json()
-        
-        formatted_results = []
-        for result in results.get("results", [])[:5]:  # Limit to top 5 results
-            formatted_results.append(f"Title: {result['title']}\nURL: {result['url']}\nSnippet: {result['content']}\n")
-        
-        return "\n".join(formatted_results) if formatted_results else "No results found."
-    except Exception as e:
-        return f"Error performing search: {str(e)}"
-
 def execute_tool(tool_name, tool_input):
     if tool_name == "create_folder":
         return create_folder(tool_input["path"])
@@ -221,6 +223,8 @@ def execute_tool(tool_name, tool_input):
         return list_files(tool_input.get("path", "."))
     elif tool_name == "searxng_search":
         return searxng_search(tool_input["query"])
+    elif tool_name == "multi_search":
+        return multi_search(tool_input["queries"], "searxng")
     else:
         return f"Unknown tool: {tool_name}"
 
@@ -228,7 +232,7 @@ def encode_image_to_base64(image_path):
     try:
         with Image.open(image_path) as img:
             max_size = (1024, 1024)
-            img.thumbnail(max_size, Image.DEFAULT_STRATEGY)
+            img.thumbnail(max_size, Image.LANCZOS)
             if img.mode != 'RGB':
                 img = img.convert('RGB')
             img_byte_arr = io.BytesIO()
@@ -332,7 +336,8 @@ def chat_with_claude(user_input, image_path=None, current_iteration=None, max_it
         print_colored(f"\nTool Used: {tool_name}", TOOL_COLOR)
         print_colored(f"Tool Input: {tool_input}", TOOL_COLOR)
         
-        result = execute_tool(tool_name, tool_input)
+        # Recorded to or replayed from the cassette along with the model calls
+        result = run_tool(execute_tool, tool_name, tool_input)
         print_colored(f"Tool Result: {result}", RESULT_COLOR)
         
         # Append tool result to conversation history
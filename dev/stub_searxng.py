@@ -0,0 +1,75 @@
+# stub_searxng.py
+#
+# A stand-in for a SearXNG instance, for trying the search layer without a real one:
+#
+#   python dev/stub_searxng.py --port 8899 --delay 0.5
+#   SEARXNG_URL=http://localhost:8899 python dev/main.py
+#
+# Every query gets a few made-up results; GET /stats reports how many searches reached
+# the server, which shows the effect of caching and request coalescing.
+
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+counts = {"searches": 0}
+counts_lock = threading.Lock()
+
+def make_results(query, count):
+    slug = "-".join(query.lower().split())
+    return [
+        {
+            "title": f"{query} result {i}",
+            "url": f"https://example.com/{slug}/{i}",
+            "content": f"Stub snippet {i} for {query}.",
+        }
+        for i in range(1, count + 1)
+    ]
+
+def make_handler(delay, count, fail_every):
+    class StubHandler(BaseHTTPRequestHandler):
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/stats":
+                return self.send_json(200, counts)
+            query = parse_qs(url.query).get("q", [""])[0]
+            with counts_lock:
+                counts["searches"] += 1
+                number = counts["searches"]
+            time.sleep(delay)
+            if fail_every and number % fail_every == 0:
+                return self.send_json(503, {"error": "stub failure"})
+            self.send_json(200, {"query": query, "results": make_results(query, count)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub SearXNG server")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument("--results", type=int, default=8, help="Results per query")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth search with HTTP 503")
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.delay, args.results, args.fail_every))
+    print(f"Stub SearXNG listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()